@@ -1,9 +1,116 @@
 import streamlit as st
 import os
 import re
-from youtube_short_generator import YoutubeShortGenerator
+import threading
+import time
+import constants
+from youtube_short_generator import YoutubeShortGenerator, warmup
+from instrumentation import Tracer
+from job_queue import JobQueue, WorkerPool, DONE, FAILED
+from video_server import start_video_server, static_video_url, video_url
+from retention import get_retention_manager
+from run_manifest import RUN_ID_PATTERN
+
+
+@st.cache_resource
+def get_worker_pool():
+    """One worker pool per Streamlit server process, shared by all sessions."""
+    return WorkerPool(JobQueue().db_path).start()
+
+
+def get_job_queue():
+    """Job queue of the worker pool; dead workers are replaced (and their jobs requeued) whenever it is used."""
+    pool = get_worker_pool()
+    pool.ensure_running()
+    return JobQueue(pool.db_path)
+
+
+@st.cache_resource
+def get_video_server():
+    """One range-request video server per Streamlit server process, or None unless VIDEO_SERVER_URL is configured."""
+    if not constants.VIDEO_SERVER_URL or not constants.VIDEO_SERVER_PORT:
+        return None
+    try:
+        return start_video_server()
+    except OSError as e:
+        print(f"Video server could not start, falling back to the download button: {e}")
+        return None
+
+
+@st.cache_resource
+def start_warmup():
+    """Warm up this server process once, in the background so the first page renders immediately."""
+    thread = threading.Thread(target=warmup, name='warmup', daemon=True)
+    thread.start()
+    return thread
+
+
+def show_download(video_path):
+    if video_path and os.path.exists(video_path):
+        st.success("Video generated successfully!")
+        # viewing a video keeps it at the back of the eviction queue
+        get_retention_manager(os.path.dirname(os.path.dirname(video_path))).touch(os.path.dirname(video_path))
+
+        if get_video_server() is not None:
+            # the browser streams the file from the video server instead of through Streamlit's memory
+            st.video(video_url(video_path))
+            st.link_button("Download Video", video_url(video_path, download=True))
+            return
+
+        # Streamlit's static file serving streams the file from disk and answers the browser's range requests
+        url = static_video_url(video_path) if st.get_option("server.enableStaticServing") else None
+        if url is not None:
+            # st.video only passes absolute URLs through, and static files other than images are sent as
+            # text/plain, so the player and a download link (saving instead of opening) are plain HTML
+            st.html(f'<video src="{url}" controls style="width: 100%"></video>'
+                    f'<p><a href="{url}" download="youtube_short.mp4">Download Video</a></p>')
+            return
+
+        # without static serving st.video keeps one copy in memory, so the player's own download is used
+        st.video(video_path)
+        st.caption("Download the video from the player's menu.")
+    else:
+        st.error("Error: Video file not found.")
+
+
+def poll_job(queue, job_id):
+    """Show a background job's status and finished stages until it completes."""
+    status_box = st.empty()
+    while True:
+        get_worker_pool().ensure_running()
+        job = queue.get(job_id)
+        if job is None:
+            st.error(f"Unknown job {job_id}.")
+            return
+        with status_box.container():
+            st.info(f"Job {job_id} is {job['status']} (last finished stage: {job['stage'] or 'none yet'})")
+            if job['progress']:
+                st.table({stage: [f"{seconds:.2f}s"] for stage, seconds in job['progress'].items()})
+        if job['status'] in (DONE, FAILED):
+            break
+        time.sleep(constants.JOB_POLL_SECONDS)
+
+    if job['status'] == DONE:
+        if job['error']:
+            st.warning(job['error'])
+        show_download(job['video_path'])
+    else:
+        st.error(f"An error occurred: {job['error']}")
+        if job['run_id']:
+            st.info(f"Completed steps were saved in run {job['run_id']}. Generating the same title again resumes it.")
+
+
+def render_stage_panel(panel, tracer):
+    """Show seconds per stage and the counters collected so far."""
+    with panel.container():
+        breakdown = tracer.stage_breakdown()
+        if breakdown:
+            st.table({stage: [f"{seconds:.2f}s"] for stage, seconds in breakdown.items()})
+        if tracer.counters:
+            st.json(dict(tracer.counters))
 
 def main():
+    start_warmup()
     st.markdown(
     "<h1 style='text-align: center;'>YT Shorts Generator</h1>",
     unsafe_allow_html=True
@@ -12,59 +119,98 @@ def main():
     
     # User Input
     video_title = st.text_input("Enter Video Title:", "Top 3 Marvel Superheroes")
+    background_mode = st.checkbox("Run as a background job (survives page refresh)", value=True)
+    # background jobs always overlap the stages and report each finished stage in their status
+    streaming_mode, show_stage_panel = True, False
+    if not background_mode:
+        streaming_mode = st.checkbox("Overlap generation stages (faster)", value=True)
+        show_stage_panel = st.checkbox("Show live stage breakdown", value=False)
+    resume_run_id = st.text_input("Resume run ID (optional):", "")
     
-    if st.button("Generate Video"):
+    generate_clicked = st.button("Generate Video")
+
+    # a refreshed page picks up the job it was following
+    if not generate_clicked and "job" in st.query_params:
+        poll_job(get_job_queue(), st.query_params["job"])
+        return
+
+    if generate_clicked:
         if video_title.strip():
             # Validate that the title starts with "Top 3" or "Top 5" (case-insensitive)
             pattern = r"^top\s*(3|5)\b"
             if not re.match(pattern, video_title.strip(), re.IGNORECASE):
                 st.warning("Please start the title with 'Top 3' or 'Top 5'.")
                 return
+
+            # the run ID names a directory on the server, so only IDs this app hands out are accepted
+            resume_run_id = resume_run_id.strip().lower()
+            if resume_run_id and not RUN_ID_PATTERN.match(resume_run_id):
+                st.warning("Please enter a run ID shown after an earlier failed run (32 hexadecimal characters).")
+                return
             
+            if background_mode:
+                queue = get_job_queue()
+                job_id = queue.submit(video_title.strip(), run_id=resume_run_id or None)
+                st.query_params["job"] = job_id
+                poll_job(queue, job_id)
+                return
+
             st.info("Starting video generation process...")
             
+            yt_generator = None
             try:
                 # Initialize Generator
-                yt_generator = YoutubeShortGenerator()
+                tracer = Tracer()
+                if show_stage_panel:
+                    panel = st.empty()
+                    script_thread = threading.current_thread()
+
+                    def on_span(record):
+                        # Streamlit elements can only be updated from the script thread
+                        if record["attributes"].get("kind") == "stage" and threading.current_thread() is script_thread:
+                            render_stage_panel(panel, tracer)
+
+                    tracer.listeners.append(on_span)
+                yt_generator = YoutubeShortGenerator(tracer=tracer, run_id=resume_run_id or None)
                 
-                with st.spinner("Analyzing title and extracting keywords..."):
-                    yt_generator.title_to_keywords(video_title)
-                    st.info("Keywords extracted successfully!")
+                if streaming_mode:
+                    with st.spinner("Generating images, audio and video..."):
+                        yt_generator.generate_streaming(video_title)
+                        st.info("Video is being finalized!")
+                    st.table({stage: [f"{seconds:.2f}s"] for stage, seconds in yt_generator.stage_timings.items()})
+                else:
+                    with st.spinner("Analyzing title and extracting keywords..."):
+                        yt_generator.title_to_keywords(video_title)
+                        st.info("Keywords extracted successfully!")
                 
-                with st.spinner("Generating images..."):
-                    yt_generator.generate_images()
-                    st.info("Images generated successfully!")
+                    with st.spinner("Generating images..."):
+                        yt_generator.generate_images()
+                        st.info("Images generated successfully!")
                 
-                with st.spinner("Overlaying text on images..."):
-                    yt_generator.overlay_text_to_images()
-                    st.info("Text overlay completed!")
+                    with st.spinner("Overlaying text on images..."):
+                        yt_generator.overlay_text_to_images()
+                        st.info("Text overlay completed!")
                 
-                with st.spinner("Generating audio clips..."):
-                    yt_generator.generate_audio_clips()
-                    st.info("Audio clips generated successfully!")
+                    with st.spinner("Generating audio clips..."):
+                        yt_generator.generate_audio_clips()
+                        st.info("Audio clips generated successfully!")
                 
-                with st.spinner("Combining images and audio into video..."):
-                    yt_generator.make_video()
-                    st.info("Video is being finalized!")
+                    with st.spinner("Combining images and audio into video..."):
+                        yt_generator.make_video()
+                        st.info("Video is being finalized!")
                 
+                
+                if yt_generator.image_placeholders:
+                    st.warning(f"The image service failed, placeholders were used for: {', '.join(sorted(yt_generator.image_placeholders))}")
+
                 # Get the generated video path
                 video_path = os.path.join(yt_generator.generated_video_dir, 'final_video.mp4')
                 
-                if os.path.exists(video_path):
-                    st.success("Video generated successfully!")
-                    
-                    # Provide a download link
-                    with open(video_path, "rb") as file:
-                        st.download_button(
-                            label="Download Video",
-                            data=file,
-                            file_name="youtube_short.mp4",
-                            mime="video/mp4"
-                        )
-                else:
-                    st.error("Error: Video file not found.")
+                show_download(video_path)
             except Exception as e:
                 st.error(f"An error occurred: {e}")
+                if yt_generator is not None and yt_generator.run_id:
+                    st.info(f"Completed steps were saved. Enter run ID {yt_generator.run_id} above to resume.")
         else:
             st.warning("Please enter a valid title.")
 
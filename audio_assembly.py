@@ -0,0 +1,100 @@
+"""
+Assemble the narration of a short into one audio track.
+
+The TTS clips are decoded to PCM once (a single ffmpeg call for all of them), padded with
+optional silence, loudness-normalized and concatenated in NumPy, and written as one WAV.
+The exact duration of every segment comes from its sample count, so the video stage can
+cut each still at the right frame and encode the audio once for the whole video instead
+of once per segment. That removes the per-segment AAC priming gaps that made the audio
+drift against the pictures at segment boundaries.
+"""
+import os
+import shutil
+import tempfile
+import wave
+from typing import NamedTuple
+import numpy as np
+import constants
+from video_encoder import run_ffmpeg
+
+
+class AudioTrack(NamedTuple):
+    path: str  # WAV file with the narration of every segment
+    sample_rate: int
+    durations: list  # seconds per segment, in order; they add up to the track length
+
+
+def decode_clips(paths, sample_rate=None):
+    """
+    Decode audio files to mono float32 arrays in [-1, 1] with one ffmpeg process.
+
+    :param paths: audio files (e.g. the TTS MP3s)
+    :param sample_rate: output sample rate, defaults to constants.AUDIO_SAMPLE_RATE
+    :return: list of 1-D arrays, one per path
+    """
+    sample_rate = sample_rate or constants.AUDIO_SAMPLE_RATE
+    work_dir = tempfile.mkdtemp(prefix='pcm_')
+    try:
+        args = []
+        for path in paths:
+            args += ['-i', path]
+        raw_paths = [os.path.join(work_dir, f"{index}.f32") for index in range(len(paths))]
+        for index, raw_path in enumerate(raw_paths):
+            args += ['-map', f'{index}:a', '-f', 'f32le', '-ac', '1', '-ar', str(sample_rate), raw_path]
+        run_ffmpeg(args)
+        return [np.fromfile(raw_path, dtype=np.float32) for raw_path in raw_paths]
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def normalize_loudness(samples, target_dbfs=None, peak=0.98):
+    """
+    Scale a clip to a target RMS level without letting its peak clip.
+
+    :param samples: float array in [-1, 1]
+    :param target_dbfs: RMS level to reach, defaults to constants.AUDIO_TARGET_DBFS
+    :param peak: highest absolute sample value allowed after scaling
+    """
+    target_dbfs = constants.AUDIO_TARGET_DBFS if target_dbfs is None else target_dbfs
+    rms = float(np.sqrt(np.mean(np.square(samples, dtype=np.float64)))) if len(samples) else 0.0
+    if rms < 1e-5:
+        return samples  # silence stays silence
+    gain = 10 ** (target_dbfs / 20) / rms
+    gain = min(gain, peak / float(np.max(np.abs(samples))))
+    return (samples * gain).astype(np.float32)
+
+
+def write_wav(path, samples, sample_rate):
+    """Write a mono float array as 16-bit PCM WAV."""
+    pcm = (np.clip(samples, -1.0, 1.0) * 32767).astype('<i2')
+    with wave.open(path, 'wb') as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes(pcm.tobytes())
+
+
+def assemble_audio(clip_paths, output_path, padding=None, normalize=None, sample_rate=None):
+    """
+    Concatenate TTS clips into one narration track.
+
+    :param clip_paths: audio clip per segment, in playback order
+    :param output_path: WAV file to write
+    :param padding: seconds of silence added after each clip, defaults to constants.AUDIO_PADDING_SECONDS
+    :param normalize: bring every clip to the same loudness, defaults to constants.AUDIO_NORMALIZE
+    :param sample_rate: sample rate of the track, defaults to constants.AUDIO_SAMPLE_RATE
+    :return: AudioTrack with the exact duration of every segment
+    """
+    padding = constants.AUDIO_PADDING_SECONDS if padding is None else padding
+    normalize = constants.AUDIO_NORMALIZE if normalize is None else normalize
+    sample_rate = sample_rate or constants.AUDIO_SAMPLE_RATE
+
+    silence = np.zeros(round(padding * sample_rate), dtype=np.float32)
+    segments = []
+    for clip in decode_clips(clip_paths, sample_rate):
+        if normalize:
+            clip = normalize_loudness(clip)
+        segments.append(np.concatenate([clip, silence]))
+
+    write_wav(output_path, np.concatenate(segments) if segments else silence, sample_rate)
+    return AudioTrack(output_path, sample_rate, [len(segment) / sample_rate for segment in segments])
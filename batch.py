@@ -0,0 +1,103 @@
+"""
+Render many shorts from a file of titles.
+
+    python batch.py titles.txt --report batch_report.jsonl
+
+Titles are read one per line (blank lines and lines starting with '#' are skipped).
+The LLM results for all titles are first extracted in one concurrent batch
+(StructuredOutputExtractor.extract_many, with retries on rate limits), then every
+title runs through YoutubeShortGenerator.generate_streaming. The Space client
+pool, the media caches and the per-service resilience policies (resilience.get_policy,
+which hold the concurrency budgets, timeouts and circuit breakers) are shared by all
+titles, and video encoding goes to a process pool. Each finished title
+appends one JSON line with its status and stage timings to the report, and a failing
+title does not stop the others.
+"""
+import argparse
+import json
+import multiprocessing
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+import constants
+from youtube_short_generator import YoutubeShortGenerator, prefetch_title_results
+
+
+def read_titles(path):
+    with open(path, encoding='utf-8') as titles_file:
+        return [line.strip() for line in titles_file if line.strip() and not line.strip().startswith('#')]
+
+
+def render_title(title, encode_executor=None, generator_factory=YoutubeShortGenerator):
+    """Render one short and return its report record; errors are recorded instead of raised."""
+    started = time.time()
+    generator = generator_factory()
+    record = {"title": title, "started_at": started}
+    try:
+        generator.generate_streaming(title, encode_executor=encode_executor)
+        record.update(status="ok", video_path=generator.video_path, video_paths=generator.video_paths)
+        if generator.image_placeholders:
+            record["placeholders"] = generator.image_placeholders
+    except Exception as e:
+        traceback.print_exc()
+        record.update(status="error", error=f"{type(e).__name__}: {e}")
+    record["seconds"] = round(time.time() - started, 3)
+    record["timings"] = {stage: round(seconds, 3) for stage, seconds in generator.stage_timings.items()}
+    return record
+
+
+def run_batch(titles, report_path, title_workers=None, encode_processes=None, generator_factory=YoutubeShortGenerator, prefetch=True,
+              extractor=None):
+    """
+    Render every title and append one JSON report line per title to report_path.
+
+    :param titles: list of video titles
+    :param report_path: JSON lines file the per-title records are appended to
+    :param title_workers: titles rendered at once, defaults to constants.BATCH_TITLE_WORKERS
+    :param encode_processes: processes used for video encoding, defaults to constants.BATCH_ENCODE_PROCESSES
+    :param generator_factory: callable returning a YoutubeShortGenerator (e.g. one wired to fakes)
+    :param prefetch: extract all titles with one batched LLM call before rendering
+    :param extractor: StructuredOutputExtractor used for the prefetch, defaults to the shared one
+    :return: list of report records in completion order
+    """
+    if prefetch:
+        try:
+            failed = prefetch_title_results(titles, extractor)
+            for title, error in failed.items():
+                print(f"Batched extraction failed for {title}, it will be retried on its own: {error}")
+        except Exception as e:
+            print(f"Batched extraction unavailable, extracting titles one by one: {e}")
+
+    title_workers = title_workers or constants.BATCH_TITLE_WORKERS
+    encode_processes = encode_processes or constants.BATCH_ENCODE_PROCESSES
+    records = []
+    report_lock = threading.Lock()
+
+    # spawn keeps worker processes from inheriting locks held by the title threads
+    with ProcessPoolExecutor(max_workers=encode_processes, mp_context=multiprocessing.get_context('spawn')) as encode_executor, \
+            ThreadPoolExecutor(max_workers=title_workers) as title_executor, \
+            open(report_path, 'a', encoding='utf-8') as report_file:
+        futures = [title_executor.submit(render_title, title, encode_executor, generator_factory) for title in titles]
+        for future in as_completed(futures):
+            record = future.result()
+            with report_lock:
+                report_file.write(json.dumps(record) + "\n")
+                report_file.flush()
+            records.append(record)
+            print(f"[{len(records)}/{len(titles)}] {record['status']}: {record['title']} ({record['seconds']}s)")
+
+    return records
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('titles_file', help="text file with one video title per line")
+    parser.add_argument('--report', default='batch_report.jsonl', help="JSON lines report appended to per title")
+    parser.add_argument('--title-workers', type=int, default=None, help="titles rendered at once")
+    parser.add_argument('--encode-processes', type=int, default=None, help="processes used for video encoding")
+    args = parser.parse_args()
+
+    records = run_batch(read_titles(args.titles_file), args.report, args.title_workers, args.encode_processes)
+    failed = sum(1 for record in records if record['status'] != 'ok')
+    print(f"Rendered {len(records) - failed}/{len(records)} shorts, report written to {args.report}")
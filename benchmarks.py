@@ -0,0 +1,448 @@
+"""
+Offline benchmarks for the generation pipeline.
+
+Run one with ``python benchmarks.py <name>`` (``python benchmarks.py --help`` lists them).
+External services are replaced by the stand-ins in fakes.py, so no API keys or
+network access are needed. ``pipeline`` runs whole shorts end to end; the others
+time a single stage.
+
+With ``--save`` the results are written to benchmark_results/ as JSON, together with
+the git commit they were measured on, and compared with the previous saved run of
+the same benchmark so regressions show up.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from PIL import Image
+import constants
+from fakes import FakeTTSBackend
+
+
+def make_synthetic_segments(work_dir, count, size=(360, 740), seconds_per_clip=2.0):
+    """Write ``count`` (image, audio) pairs shaped like the overlaid frames and TTS clips of a short."""
+    tts = FakeTTSBackend(seconds_per_word=seconds_per_clip, min_seconds=seconds_per_clip, tone_hz=440)
+    segments = []
+    for index in range(count):
+        image_path = os.path.join(work_dir, f"{index}.png")
+        audio_path = os.path.join(work_dir, f"{index}.mp3")
+        Image.effect_noise(size, 64).convert('RGB').save(image_path)
+        tts.synthesize("clip", audio_path)
+        segments.append((image_path, audio_path))
+    return segments
+
+
+def benchmark_video_engines(segments=6, repeat=1):
+    """Compare the ffmpeg still-image engine against MoviePy compositing on one short."""
+    from video_encoder import VIDEO_ENGINES
+
+    work_dir = tempfile.mkdtemp(prefix='bench_video_')
+    try:
+        pairs = make_synthetic_segments(work_dir, segments)
+        results = {}
+        for engine, make_video in VIDEO_ENGINES.items():
+            timings = []
+            for run in range(repeat):
+                output_path = os.path.join(work_dir, f"{engine}_{run}.mp4")
+                started = time.perf_counter()
+                make_video(pairs, output_path)
+                timings.append(time.perf_counter() - started)
+            results[engine] = {
+                "seconds": round(min(timings), 3),
+                "output_bytes": os.path.getsize(output_path),
+            }
+        results["speedup"] = round(results["moviepy"]["seconds"] / results["ffmpeg"]["seconds"], 2)
+        return results
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def benchmark_encoding_profiles(segments=6, repeat=1):
+    """Time the ffmpeg engine for every encoding profile and for 1..cpu_count parallel segment encoders."""
+    from video_encoder import ENCODING_PROFILES, make_ffmpeg_slideshow
+
+    work_dir = tempfile.mkdtemp(prefix='bench_encode_')
+    try:
+        pairs = make_synthetic_segments(work_dir, segments)
+        worker_counts = sorted({1, *range(2, (os.cpu_count() or 1) + 1, 2), os.cpu_count() or 1})
+        results = {"cpu_count": os.cpu_count(), "profiles": {}}
+        for profile in ENCODING_PROFILES:
+            results["profiles"][profile] = {}
+            for workers in worker_counts:
+                timings = []
+                for run in range(repeat):
+                    output_path = os.path.join(work_dir, f"{profile}_{workers}_{run}.mp4")
+                    started = time.perf_counter()
+                    make_ffmpeg_slideshow(pairs, output_path, profile=profile, workers=workers)
+                    timings.append(time.perf_counter() - started)
+                results["profiles"][profile][f"workers_{workers}"] = {
+                    "seconds": round(min(timings), 3),
+                    "output_bytes": os.path.getsize(output_path),
+                }
+        return results
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def benchmark_text_contrast(segments=6, repeat=1):
+    """Compare the NumPy text-region contrast analyzer against the old full-image PIL ImageStat mean."""
+    from PIL import ImageStat
+    from function_wrap_center import choose_text_style, choose_text_styles
+
+    def imagestat_brightness(image, threshold=128):
+        # previous is_image_dark: grayscale the whole frame and take one global mean
+        return ImageStat.Stat(image.convert('L')).mean[0] < threshold
+
+    frames = [Image.effect_noise((720, 1280), 64).convert('RGB') for _ in range(segments)]
+    text_box = (20, 560, 700, 720)
+    variants = {
+        "imagestat_full_frame": lambda: [imagestat_brightness(frame) for frame in frames],
+        "numpy_per_frame": lambda: [choose_text_style(frame, text_box) for frame in frames],
+        "numpy_batch": lambda: choose_text_styles(frames, [text_box] * len(frames)),
+    }
+    results = {}
+    for name, run in variants.items():
+        timings = []
+        for _ in range(max(repeat, 5)):
+            started = time.perf_counter()
+            run()
+            timings.append(time.perf_counter() - started)
+        results[name] = {"ms_per_frame": round(min(timings) * 1000 / len(frames), 3)}
+    results["speedup"] = round(results["imagestat_full_frame"]["ms_per_frame"] / results["numpy_batch"]["ms_per_frame"], 2)
+    return results
+
+
+def benchmark_llm_batch(segments=6, repeat=1):
+    """Throughput of one-at-a-time extract() against extract_many() on a fake chat model that rate-limits 20% of calls."""
+    from structured_output import StructuredOutputExtractor
+    from resilience import ResiliencePolicy
+    from youtube_short_generator import TopN
+    from fakes import FakeChatModel
+
+    titles = [f"Top {3 + index % 3} things number {index}" for index in range(segments * 4)]
+    results = {"titles": len(titles)}
+    for name in ("sequential", "extract_many"):
+        llm = FakeChatModel(latency=0.25, failure_rate=0.2)
+        # both variants retry with the same (short) backoff, so only the concurrency differs
+        policy = ResiliencePolicy('llm', max_retries=constants.LLM_MAX_RETRIES, backoff=0.05,
+                                  semaphore=threading.BoundedSemaphore(constants.SERVICE_CONCURRENCY['llm']))
+        extractor = StructuredOutputExtractor(TopN, llm=llm, policy=policy)
+        started = time.perf_counter()
+        if name == "sequential":
+            outputs = [extractor.extract(title) for title in titles]
+        else:
+            outputs, _ = extractor.extract_many(titles)
+        seconds = time.perf_counter() - started
+        results[name] = {
+            "seconds": round(seconds, 3),
+            "titles_per_second": round(len(titles) / seconds, 2),
+            "succeeded": sum(output is not None for output in outputs),
+            "model_calls": llm.calls,
+        }
+    return results
+
+
+def benchmark_resilience(segments=6, repeat=1):
+    """Success rate and latency percentiles of calls to a flaky fake service, bare and through ResiliencePolicy with and without hedging."""
+    from concurrent.futures import ThreadPoolExecutor
+    from fakes import FaultInjector
+    from resilience import ResiliencePolicy
+
+    def remote_call(index):
+        time.sleep(0.1)
+        return index
+
+    policies = {
+        "bare": None,
+        "timeout_retries": dict(timeout=1.0, max_retries=3, backoff=0.05),
+        "timeout_retries_hedged": dict(timeout=1.0, max_retries=3, backoff=0.05, hedge_after=0.3),
+    }
+    calls = segments * 8
+    results = {"calls": calls}
+    for name, options in policies.items():
+        # 10% errors, 10% slow (2s) and 2% stuck (10s) calls, the same sequence for every variant
+        service = FaultInjector(remote_call, failure_rate=0.1, slow_rate=0.1, slow_seconds=2.0, hang_rate=0.02, hang_seconds=10.0)
+        call = ResiliencePolicy(name, **options).call if options else (lambda fn, *args: fn(*args))
+
+        def timed(index):
+            started = time.perf_counter()
+            try:
+                call(service, index)
+                return time.perf_counter() - started
+            except Exception:
+                return None
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            outcomes = list(executor.map(timed, range(calls)))
+        latencies = sorted(latency for latency in outcomes if latency is not None)
+        results[name] = {
+            "seconds": round(time.perf_counter() - started, 3),
+            "succeeded": len(latencies),
+            "service_calls": service.calls,
+            "p50_s": round(latencies[len(latencies) // 2], 3),
+            "p95_s": round(latencies[int(len(latencies) * 0.95)], 3),
+            "max_s": round(latencies[-1], 3),
+        }
+    return results
+
+
+def import_time_ms(module):
+    """Cumulative import time of module in a fresh interpreter, from ``python -X importtime``."""
+    output = subprocess.run([sys.executable, '-X', 'importtime', '-c', f"import {module}"],
+                            capture_output=True, text=True, check=True).stderr
+    for line in output.splitlines():
+        match = re.match(r"import time:\s*\d+ \|\s*(\d+) \|\s*(\S+)$", line)
+        if match and match.group(2) == module:
+            return round(int(match.group(1)) / 1000, 1)
+    raise RuntimeError(f"{module} not found in -X importtime output")
+
+
+def benchmark_import_time(segments=6, repeat=1):
+    """Startup cost of importing the app modules, against the dependencies they now defer to first use."""
+    from youtube_short_generator import warmup
+
+    modules = ["youtube_short_generator", "job_queue", "batch"]
+    deferred = ["langgraph.graph", "gradio_client", "gtts", "moviepy.editor"]
+    results = {"modules_ms": {}, "deferred_ms": {}}
+    for group, names in (("modules_ms", modules), ("deferred_ms", deferred)):
+        for name in names:
+            results[group][name] = min(import_time_ms(name) for _ in range(repeat))
+    # the deferred modules would otherwise be part of every import above
+    results["deferred_total_ms"] = round(sum(results["deferred_ms"].values()), 1)
+    results["warmup_s"] = warmup()
+    return results
+
+
+def benchmark_overlay(segments=6, repeat=1):
+    """Frames per second of per-file add_text_to_image calls against overlay_frames, inline and on a process pool."""
+    from function_wrap_center import add_text_to_image, overlay_frames
+    from render_profiles import PROFILES
+
+    sizes = [profile['size'] for profile in PROFILES.values()]
+    work_dir = tempfile.mkdtemp(prefix='bench_overlay_')
+    try:
+        sources = []
+        for index in range(segments):
+            path = os.path.join(work_dir, f"{index}.png")
+            Image.effect_noise((1080, 1920), 64).convert('RGB').save(path)
+            sources.append((path, "Top 5 mountains in the world" if index == 0 else f"Mountain number {index}", index == 0))
+        frame_count = len(sources) * len(sizes)
+
+        def per_file():
+            # the old path: one open, resize, draw and PNG write per frame
+            for path, text, is_title in sources:
+                for size in sizes:
+                    add_text_to_image(path, text, is_title, save_to=path + f".{size[0]}x{size[1]}.out.png", size=size)
+
+        def batched(executor=None):
+            jobs = []
+            for path, text, is_title in sources:
+                with Image.open(path) as image:
+                    source = image.convert('RGB')
+                jobs.extend((source, text, is_title, size) for size in sizes)
+            return overlay_frames(jobs, executor=executor)
+
+        variants = {"per_file": per_file, "overlay_frames": batched}
+        processes = os.cpu_count() or 1
+        pool = None
+        if processes > 1:
+            pool = ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('spawn'))
+            batched(pool)  # start the workers outside the timing
+            variants[f"overlay_frames_{processes}_processes"] = lambda: batched(pool)
+
+        results = {"frames": frame_count}
+        try:
+            for name, run in variants.items():
+                timings = []
+                for _ in range(repeat):
+                    started = time.perf_counter()
+                    run()
+                    timings.append(time.perf_counter() - started)
+                results[name] = {"frames_per_second": round(frame_count / min(timings), 1)}
+        finally:
+            if pool is not None:
+                pool.shutdown()
+        return results
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+# latency in seconds of each faked service in the end-to-end scenarios
+FAKE_LATENCY = {"llm": 0.3, "image": 1.0, "tts": 0.3}
+
+PIPELINE_SCENARIOS = {
+    "top3": ["Top 3 Cats"],
+    "top5": ["Top 5 Mountains in the world"],
+    "batch": ["Top 3 Cats", "Top 5 Dogs", "Top 3 Rivers", "Top 5 Cities"],
+}
+
+
+def make_fake_generator_factory(work_dir, latency=FAKE_LATENCY):
+    """
+    Build a generator_factory whose generators only talk to local fakes and write below work_dir.
+
+    The LLM returns a canned TopN for the title, images are textured 9:16 PNGs at the
+    requested size and TTS writes silent MP3s of a length set by the word count, each
+    after the given latency. Caches and retention use their own directories in work_dir.
+
+    :return: (generator_factory, extractor)
+    """
+    from fakes import FakeChatModel, FakeTTSBackend, fake_client_factory
+    from image_generator import GradioClientPool, ImageGenerator
+    from media_cache import MediaCache
+    from retention import RetentionManager
+    from structured_output import StructuredOutputExtractor
+    from text_to_speech import TextToSpeech
+    from youtube_short_generator import TopN, YoutubeShortGenerator
+
+    media_dir = os.path.join(work_dir, 'generated_media')
+    extractor = StructuredOutputExtractor(TopN, llm=FakeChatModel(latency=latency["llm"]))
+    client_pool = GradioClientPool('fake/space', client_factory=fake_client_factory(latency["image"], textured=True))
+    image_cache = MediaCache(os.path.join(work_dir, 'cache', 'images'), 500 * 1024 * 1024, extension='.png')
+    tts_cache = MediaCache(os.path.join(work_dir, 'cache', 'audio'), 100 * 1024 * 1024, extension='.mp3')
+    retention = RetentionManager(media_dir, max_bytes=0, max_age=0, max_runs=0)
+
+    def factory():
+        return YoutubeShortGenerator(
+            tts=TextToSpeech(FakeTTSBackend(latency=latency["tts"]), cache=tts_cache),
+            image_generator=ImageGenerator(client_pool, cache=image_cache),
+            extractor=extractor,
+            retention=retention,
+            media_dir=media_dir,
+        )
+    return factory, extractor
+
+
+def run_pipeline_scenario(scenario, work_dir):
+    """Render one scenario in this process and measure it; meant to run in a fresh process."""
+    import resource
+    from batch import render_title, run_batch
+
+    titles = PIPELINE_SCENARIOS[scenario]
+    factory, extractor = make_fake_generator_factory(work_dir)
+    started = time.perf_counter()
+    if len(titles) > 1:
+        records = run_batch(titles, os.path.join(work_dir, 'report.jsonl'), generator_factory=factory, extractor=extractor)
+    else:
+        records = [render_title(titles[0], generator_factory=factory)]
+    wall_seconds = time.perf_counter() - started
+
+    stages = {}
+    for record in records:
+        for stage_name, seconds in record["timings"].items():
+            stages[stage_name] = stages.get(stage_name, 0.0) + seconds / len(records)
+    video_paths = [path for record in records if record["status"] == "ok" for path in record["video_paths"].values()]
+    return {
+        "titles": len(titles),
+        "failed": [record["title"] for record in records if record["status"] != "ok"],
+        "wall_s": round(wall_seconds, 3),
+        "stages_s": {stage_name: round(seconds, 3) for stage_name, seconds in stages.items()},
+        # ru_maxrss is in kilobytes on Linux; for children it is the largest single child (ffmpeg or an
+        # encode process), which includes memory inherited from this process when it was forked
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "peak_child_rss_mb": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1),
+        "output_bytes": sum(os.path.getsize(path) for path in video_paths),
+    }
+
+
+def benchmark_pipeline(segments=6, repeat=1):
+    """End-to-end Top 3, Top 5 and batch runs against the fakes; each run gets a fresh process."""
+    results = {"fake_latency_s": FAKE_LATENCY, "scenarios": {}}
+    context = multiprocessing.get_context('spawn')
+    for scenario in PIPELINE_SCENARIOS:
+        runs = []
+        for _ in range(repeat):
+            work_dir = tempfile.mkdtemp(prefix=f'bench_{scenario}_')
+            try:
+                with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                    runs.append(executor.submit(run_pipeline_scenario, scenario, work_dir).result())
+            finally:
+                shutil.rmtree(work_dir, ignore_errors=True)
+        results["scenarios"][scenario] = min(runs, key=lambda run: run["wall_s"])
+    return results
+
+
+def _numeric_leaves(data, prefix=""):
+    for key, value in data.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict):
+            yield from _numeric_leaves(value, path + ".")
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield path, value
+
+
+def save_results(name, results, results_dir='benchmark_results'):
+    """Write results as JSON next to earlier runs and return (path, previous saved run or None)."""
+    os.makedirs(results_dir, exist_ok=True)
+    previous_files = sorted(path for path in os.listdir(results_dir) if path.startswith(f"{name}_") and path.endswith('.json'))
+    previous = None
+    if previous_files:
+        with open(os.path.join(results_dir, previous_files[-1]), encoding='utf-8') as previous_file:
+            previous = json.load(previous_file)
+
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    record = {
+        "benchmark": name,
+        "created_at": datetime.now().isoformat(timespec='seconds'),
+        "git_commit": commit,
+        "python": sys.version.split()[0],
+        "cpu_count": os.cpu_count(),
+        "results": results,
+    }
+    path = os.path.join(results_dir, f"{name}_{datetime.now():%Y%m%d-%H%M%S}.json")
+    with open(path, 'w', encoding='utf-8') as results_file:
+        json.dump(record, results_file, indent=2)
+    return path, previous
+
+
+def compare_results(previous, current):
+    """Relative change of every numeric value present in both runs, e.g. {'scenarios.top3.wall_s': '+4.1%'}."""
+    before = dict(_numeric_leaves(previous))
+    changes = {}
+    for path, value in _numeric_leaves(current):
+        if before.get(path):
+            changes[path] = f"{(value - before[path]) / before[path] * 100:+.1f}%"
+    return changes
+
+
+BENCHMARKS = {
+    'video': benchmark_video_engines,
+    'encode': benchmark_encoding_profiles,
+    'contrast': benchmark_text_contrast,
+    'llm': benchmark_llm_batch,
+    'imports': benchmark_import_time,
+    'pipeline': benchmark_pipeline,
+    'overlay': benchmark_overlay,
+    'resilience': benchmark_resilience,
+}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('benchmark', choices=sorted(BENCHMARKS))
+    parser.add_argument('--segments', type=int, default=6, help="number of title + item segments")
+    parser.add_argument('--repeat', type=int, default=1, help="runs per variant, the fastest is reported")
+    parser.add_argument('--save', action='store_true', help="store the results in benchmark_results/ and compare with the last saved run")
+    args = parser.parse_args()
+
+    results = BENCHMARKS[args.benchmark](segments=args.segments, repeat=args.repeat)
+    print(json.dumps(results, indent=2))
+    if args.save:
+        path, previous = save_results(args.benchmark, results)
+        print(f"Results saved to {path}")
+        if previous:
+            print(f"Change since {previous['created_at']} ({previous['git_commit']}):")
+            print(json.dumps(compare_results(previous["results"], results), indent=2))
@@ -37,4 +37,110 @@ selected_embedding_model = {
         "anthropic": os.getenv('ANTHROPIC_EMBEDDING_MODEL'),
         "ollama": os.getenv('OLLAMA_EMBEDDING_MODEL')
 
-    }
\ No newline at end of file
+    }
+
+# Maximum number of image generation requests kept in flight at once
+IMAGE_GENERATION_MAX_WORKERS = int(os.getenv('IMAGE_GENERATION_MAX_WORKERS', 3))
+
+# Number of Gradio clients kept open per image generation Space
+IMAGE_GENERATION_CLIENT_POOL_SIZE = int(os.getenv('IMAGE_GENERATION_CLIENT_POOL_SIZE', 1))
+
+# On-disk cache of generated images, set IMAGE_CACHE_MAX_BYTES=0 to disable
+IMAGE_CACHE_DIR = os.getenv('IMAGE_CACHE_DIR', 'media_cache/images')
+IMAGE_CACHE_MAX_BYTES = int(os.getenv('IMAGE_CACHE_MAX_BYTES', 500 * 1024 * 1024))
+
+# Text-to-speech concurrency and on-disk clip cache, set TTS_CACHE_MAX_BYTES=0 to disable
+TTS_MAX_WORKERS = int(os.getenv('TTS_MAX_WORKERS', 4))
+TTS_CACHE_DIR = os.getenv('TTS_CACHE_DIR', 'media_cache/audio')
+TTS_CACHE_MAX_BYTES = int(os.getenv('TTS_CACHE_MAX_BYTES', 100 * 1024 * 1024))
+
+# In-memory cache of LLM results for recently requested titles
+TITLE_CACHE_MAX_ENTRIES = int(os.getenv('TITLE_CACHE_MAX_ENTRIES', 256))
+TITLE_CACHE_TTL_SECONDS = int(os.getenv('TITLE_CACHE_TTL_SECONDS', 24 * 60 * 60))
+
+# Video assembly: 'ffmpeg' encodes each still once, 'moviepy' composites every frame
+VIDEO_ENGINE = os.getenv('VIDEO_ENGINE', 'ffmpeg')
+VIDEO_FPS = int(os.getenv('VIDEO_FPS', 24))
+
+# Encoding profile (see video_encoder.ENCODING_PROFILES) and segments encoded in parallel
+VIDEO_PROFILE = os.getenv('VIDEO_PROFILE', 'standard')
+VIDEO_ENCODE_WORKERS = int(os.getenv('VIDEO_ENCODE_WORKERS', os.cpu_count() or 1))
+
+# Narration track: TTS clips are decoded once and joined into one track before encoding;
+# silence added after every clip (seconds) and per-clip loudness normalization to an RMS level
+AUDIO_SAMPLE_RATE = int(os.getenv('AUDIO_SAMPLE_RATE', 44100))
+AUDIO_PADDING_SECONDS = float(os.getenv('AUDIO_PADDING_SECONDS', 0.0))
+AUDIO_NORMALIZE = os.getenv('AUDIO_NORMALIZE', 'true').lower() in ('1', 'true', 'yes')
+AUDIO_TARGET_DBFS = float(os.getenv('AUDIO_TARGET_DBFS', -20.0))
+
+# Processes drawing overlay text in overlay_frames (1 draws in the calling process)
+OVERLAY_PROCESSES = int(os.getenv('OVERLAY_PROCESSES', os.cpu_count() or 1))
+
+# Formats rendered per run (see render_profiles.PROFILES), comma separated; the first one is final_video.mp4
+RENDER_PROFILES = [name.strip() for name in os.getenv('RENDER_PROFILES', 'standard').split(',') if name.strip()]
+
+# Retries of rate-limited (429) or failed (5xx) LLM requests in extract_many, with exponential backoff
+LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', 4))
+LLM_BACKOFF_SECONDS = float(os.getenv('LLM_BACKOFF_SECONDS', 1.0))
+
+# Process-wide cap on concurrent calls to each external service, shared by all generators
+SERVICE_CONCURRENCY = {
+        "llm": int(os.getenv('LLM_MAX_CONCURRENCY', 4)),
+        "image": int(os.getenv('IMAGE_MAX_CONCURRENCY', 6)),
+        "tts": int(os.getenv('TTS_MAX_CONCURRENCY', 8))
+    }
+
+# Resilience of remote calls (see resilience.py): seconds before an attempt is abandoned, retries of
+# transient failures, seconds before a slow attempt gets a hedged duplicate (0 disables; hedges cost a
+# second GPU job or LLM request, so only the cheap TTS calls hedge by default), consecutive failures
+# that open the circuit, which is probed again after reset_seconds, and seconds a call waits for a slot of
+# SERVICE_CONCURRENCY before it fails without calling the service
+REMOTE_CALL_POLICIES = {
+        "llm": {"timeout": float(os.getenv('LLM_TIMEOUT_SECONDS', 90)), "max_retries": LLM_MAX_RETRIES,
+                "backoff": LLM_BACKOFF_SECONDS, "hedge_after": float(os.getenv('LLM_HEDGE_SECONDS', 0)),
+                "failure_threshold": int(os.getenv('LLM_CIRCUIT_FAILURES', 5)), "reset_seconds": 30.0,
+                "slot_timeout": float(os.getenv('LLM_SLOT_TIMEOUT_SECONDS', 300))},
+        "image": {"timeout": float(os.getenv('IMAGE_TIMEOUT_SECONDS', 180)), "max_retries": int(os.getenv('IMAGE_MAX_RETRIES', 2)),
+                  "backoff": 2.0, "hedge_after": float(os.getenv('IMAGE_HEDGE_SECONDS', 0)),
+                  "failure_threshold": int(os.getenv('IMAGE_CIRCUIT_FAILURES', 5)), "reset_seconds": 60.0,
+                  "slot_timeout": float(os.getenv('IMAGE_SLOT_TIMEOUT_SECONDS', 600))},
+        "tts": {"timeout": float(os.getenv('TTS_TIMEOUT_SECONDS', 30)), "max_retries": int(os.getenv('TTS_MAX_RETRIES', 3)),
+                "backoff": 0.5, "hedge_after": float(os.getenv('TTS_HEDGE_SECONDS', 5)),
+                "failure_threshold": int(os.getenv('TTS_CIRCUIT_FAILURES', 8)), "reset_seconds": 30.0,
+                "slot_timeout": float(os.getenv('TTS_SLOT_TIMEOUT_SECONDS', 120))},
+    }
+
+# Fallbacks once retries are exhausted or a circuit is open: a placeholder background instead of a failed
+# image (off by default; placeholders are reported and never checkpointed, so a rerun asks the Space again),
+# and a second LLM provider (one of the providers above, unset to disable)
+IMAGE_PLACEHOLDER_FALLBACK = os.getenv('IMAGE_PLACEHOLDER_FALLBACK', 'false').lower() in ('1', 'true', 'yes')
+LLM_FALLBACK_PROVIDER = os.getenv('LLM_FALLBACK_PROVIDER')
+
+# Batch rendering: titles processed at once and processes used for video encoding
+BATCH_TITLE_WORKERS = int(os.getenv('BATCH_TITLE_WORKERS', 3))
+BATCH_ENCODE_PROCESSES = int(os.getenv('BATCH_ENCODE_PROCESSES', os.cpu_count() or 1))
+
+# JSON lines file that timing spans and counters are appended to (unset to disable)
+TRACE_FILE = os.getenv('TRACE_FILE')
+
+# Background job queue used by the Streamlit app. A running job heartbeats every JOB_HEARTBEAT_SECONDS and is
+# requeued once it has been silent for JOB_STALE_SECONDS, far less than a stage can take
+JOB_DB_PATH = os.getenv('JOB_DB_PATH', 'jobs/jobs.sqlite3')
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', 2))
+JOB_POLL_SECONDS = float(os.getenv('JOB_POLL_SECONDS', 1))
+JOB_HEARTBEAT_SECONDS = float(os.getenv('JOB_HEARTBEAT_SECONDS', 5))
+JOB_STALE_SECONDS = int(os.getenv('JOB_STALE_SECONDS', 60))
+
+# Optional range-request server for finished videos. It is only used when VIDEO_SERVER_URL is set to the
+# address browsers reach it at (e.g. through a reverse proxy); otherwise videos are served by Streamlit,
+# which also works where only the app port is exposed (e.g. a Hugging Face Space)
+VIDEO_SERVER_HOST = os.getenv('VIDEO_SERVER_HOST', '127.0.0.1')
+VIDEO_SERVER_PORT = int(os.getenv('VIDEO_SERVER_PORT', 8502))
+VIDEO_SERVER_URL = os.getenv('VIDEO_SERVER_URL')
+
+# Retention of generated runs in generated_media (0 disables a limit)
+RETENTION_MAX_BYTES = int(os.getenv('RETENTION_MAX_BYTES', 2 * 1024 * 1024 * 1024))
+RETENTION_MAX_AGE_SECONDS = int(os.getenv('RETENTION_MAX_AGE_SECONDS', 7 * 24 * 60 * 60))
+RETENTION_MAX_RUNS = int(os.getenv('RETENTION_MAX_RUNS', 5))
+RETENTION_LEASE_SECONDS = int(os.getenv('RETENTION_LEASE_SECONDS', 60 * 60))
+RETENTION_SWEEP_SECONDS = int(os.getenv('RETENTION_SWEEP_SECONDS', 10 * 60))
@@ -0,0 +1,245 @@
+"""
+Local stand-ins for the external services used by the generator.
+
+These let the pipeline run offline (tests, benchmarks, air-gapped machines)
+by injecting them in place of the real Hugging Face Space client, chat model and gTTS.
+"""
+import asyncio
+import hashlib
+import os
+import random
+import re
+import subprocess
+import tempfile
+import threading
+import time
+from PIL import Image
+
+
+class FakeGradioClient:
+    """
+    Offline replacement for ``gradio_client.Client`` pointed at the image generation Space.
+
+    ``predict`` renders a PNG whose colour (and, with ``textured``, noise pattern) is
+    derived from the prompt, so the same prompt always produces the same image. Textured
+    images compress and encode like real photos, solid ones are nearly free. ``instances`` counts how many clients were built,
+    which is how pooling can be checked without a network connection.
+    """
+    instances = 0
+    _instances_lock = threading.Lock()
+
+    def __init__(self, src, hf_token=None, latency=0.0, output_dir=None, textured=False):
+        with FakeGradioClient._instances_lock:
+            FakeGradioClient.instances += 1
+        self.src = src
+        self.hf_token = hf_token
+        self.latency = latency
+        self.textured = textured
+        self.output_dir = output_dir or tempfile.mkdtemp(prefix='fake_space_')
+        self.predict_calls = 0
+        self.closed = False
+
+    def predict(self, prompt, width=720, height=1280, api_name=None):
+        if self.closed:
+            raise ConnectionError("fake client has been closed")
+        self.predict_calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+        digest = hashlib.sha256(prompt.encode('utf-8')).digest()
+        path = os.path.join(self.output_dir, f"{digest.hex()[:16]}_{width}x{height}.png")
+        if self.textured:
+            import numpy as np
+
+            noise = np.random.default_rng(int.from_bytes(digest[:8], 'big')).integers(-48, 48, (height, width, 3))
+            pixels = np.clip(np.array(list(digest[:3]), dtype=np.int16) + noise, 0, 255).astype(np.uint8)
+            Image.fromarray(pixels).save(path)
+        else:
+            Image.new('RGB', (width, height), color=tuple(digest[:3])).save(path)
+        return path
+
+    def close(self):
+        self.closed = True
+
+
+def fake_client_factory(latency=0.0, textured=False, faults=None):
+    """
+    Build a ``client_factory`` for ``GradioClientPool`` that creates ``FakeGradioClient`` objects.
+
+    :param faults: FaultInjector options (e.g. {'failure_rate': 0.2}) applied to every client's predict
+    """
+    def factory(src, hf_token=None):
+        client = FakeGradioClient(src, hf_token=hf_token, latency=latency, textured=textured)
+        if faults:
+            inject_faults(client, 'predict', **faults)
+        return client
+    return factory
+
+
+class FakeRateLimitError(Exception):
+    """Stands in for a provider SDK's HTTP error; carries the status code like the real ones do."""
+
+    def __init__(self, status_code=429):
+        super().__init__(f"fake HTTP {status_code}")
+        self.status_code = status_code
+
+
+class FaultInjector:
+    """
+    Wraps a callable and makes it misbehave the way a remote service does under load.
+
+    Each call independently fails with a FakeRateLimitError (one of ``failure_statuses``),
+    runs ``slow_seconds`` late, or hangs for ``hang_seconds`` before answering, with the
+    given probabilities. Decisions come from a seeded generator, so a run is reproducible
+    for a given call order. ``calls`` and ``faults`` count what happened.
+    """
+
+    def __init__(self, fn, failure_rate=0.0, failure_statuses=(503,), slow_rate=0.0, slow_seconds=2.0,
+                 hang_rate=0.0, hang_seconds=60.0, seed=0):
+        self.fn = fn
+        self.failure_rate = failure_rate
+        self.failure_statuses = failure_statuses
+        self.slow_rate = slow_rate
+        self.slow_seconds = slow_seconds
+        self.hang_rate = hang_rate
+        self.hang_seconds = hang_seconds
+        self.calls = 0
+        self.faults = {'failure': 0, 'slow': 0, 'hang': 0}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def __call__(self, *args, **kwargs):
+        with self._lock:
+            self.calls += 1
+            roll = self._random.random()
+            status = self._random.choice(self.failure_statuses)
+        if roll < self.failure_rate:
+            fault = 'failure'
+        elif roll < self.failure_rate + self.slow_rate:
+            fault = 'slow'
+        elif roll < self.failure_rate + self.slow_rate + self.hang_rate:
+            fault = 'hang'
+        else:
+            fault = None
+        if fault:
+            with self._lock:
+                self.faults[fault] += 1
+        if fault == 'failure':
+            raise FakeRateLimitError(status)
+        if fault == 'slow':
+            time.sleep(self.slow_seconds)
+        elif fault == 'hang':
+            time.sleep(self.hang_seconds)
+        return self.fn(*args, **kwargs)
+
+
+def inject_faults(obj, method_name, **options):
+    """Replace obj.method_name with a FaultInjector around it (e.g. a fake client's predict or a TTS backend's synthesize)."""
+    injector = FaultInjector(getattr(obj, method_name), **options)
+    setattr(obj, method_name, injector)
+    return injector
+
+
+class FakeChatModel:
+    """
+    Offline chat model for StructuredOutputExtractor(llm=...).
+
+    ``with_structured_output(schema)`` returns a runnable that fills the schema from the
+    query alone: string fields echo the query and list fields get one entry per item of
+    a "Top N ..." title, so a TopN result always has N items and N prompts. ``latency``
+    simulates the round-trip, and ``failure_rate`` makes that share of calls raise a
+    FakeRateLimitError (429, or one of ``failure_statuses``) to exercise retries.
+    """
+
+    def __init__(self, latency=0.0, failure_rate=0.0, failure_statuses=(429,), seed=0):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.failure_statuses = failure_statuses
+        self.calls = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _maybe_fail(self):
+        with self._lock:
+            self.calls += 1
+            failing = self._random.random() < self.failure_rate
+            status = self._random.choice(self.failure_statuses)
+        if failing:
+            raise FakeRateLimitError(status)
+
+    @staticmethod
+    def respond(query, schema):
+        """Build a schema instance from the query, e.g. 'Top 3 Cats' -> 3 items and 3 prompts."""
+        match = re.match(r"\s*top\s*(\d+)\s*(.*)", query, re.IGNORECASE)
+        item_count = int(match.group(1)) if match else 3
+        subject = (match.group(2) if match else query).strip() or "things"
+        values = {}
+        for name, field in schema.model_fields.items():
+            if getattr(field.annotation, '__origin__', None) is list:
+                values[name] = [f"{subject} {name} {index + 1}" for index in range(item_count)]
+            else:
+                values[name] = query
+        return schema(**values)
+
+    def with_structured_output(self, schema):
+        from langchain_core.runnables import RunnableLambda
+
+        def invoke(query):
+            if self.latency:
+                time.sleep(self.latency)
+            self._maybe_fail()
+            return self.respond(query, schema)
+
+        async def ainvoke(query):
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            self._maybe_fail()
+            return self.respond(query, schema)
+
+        return RunnableLambda(invoke, afunc=ainvoke)
+
+
+class FakeTTSBackend:
+    """
+    Deterministic TTS stub that writes a silent (or tone) MP3 instead of calling Google.
+
+    The clip length depends only on the number of words, so runs are reproducible.
+    Encoding uses the ffmpeg binary bundled with imageio-ffmpeg (a moviepy dependency).
+    """
+    name = 'fake'
+
+    def __init__(self, seconds_per_word=0.4, min_seconds=1.0, latency=0.0, tone_hz=None, lang='en', voice='silent'):
+        self.seconds_per_word = seconds_per_word
+        self.min_seconds = min_seconds
+        self.latency = latency
+        self.tone_hz = tone_hz
+        self.lang = lang
+        self.voice = voice
+        self.calls = 0
+
+    def duration(self, text):
+        return max(self.min_seconds, len(text.split()) * self.seconds_per_word)
+
+    def synthesize(self, text, path):
+        import imageio_ffmpeg
+
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+        source = f"sine=frequency={self.tone_hz}:sample_rate=24000" if self.tone_hz else "anullsrc=r=24000:cl=mono"
+        subprocess.run(
+            [imageio_ffmpeg.get_ffmpeg_exe(), '-v', 'error', '-y', '-f', 'lavfi', '-i', source,
+             '-t', f"{self.duration(text):.3f}", '-ac', '1', '-c:a', 'libmp3lame', '-b:a', '32k', path],
+            check=True,
+        )
+
+
+if __name__ == '__main__':
+    from image_generator import GradioClientPool, ImageGenerator
+
+    pool = GradioClientPool('fake/space', client_factory=fake_client_factory())
+    generator = ImageGenerator(client_pool=pool)
+    for index in range(3):
+        print(generator.generate_image(f"A cat number {index}", path=os.path.join(tempfile.gettempdir(), f"fake_{index}.png")))
+    print("Clients created:", FakeGradioClient.instances)
@@ -1,7 +1,78 @@
-from PIL import Image, ImageDraw, ImageFont,ImageStat,ImageFilter,ImageEnhance
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import NamedTuple, Optional
+from PIL import Image, ImageDraw, ImageFont,ImageOps
+import numpy as np
 import constants
 import os
 
+
+# setting up font_paths
+FONT_PATHS = {
+    "weaselic" : os.path.join(constants.FONT_BASE_DIR,'Weaselic.ttf'),
+    "black": os.path.join(constants.FONT_BASE_DIR,'Roboto/Roboto-Black.ttf'),
+    "bold": os.path.join(constants.FONT_BASE_DIR,'Roboto/Roboto-Bold.ttf'),
+    "medium": os.path.join(constants.FONT_BASE_DIR,'Roboto/Roboto-Medium.ttf'),
+    "light": os.path.join(constants.FONT_BASE_DIR,'Roboto/Roboto-Light.ttf'),
+    "thin": os.path.join(constants.FONT_BASE_DIR,'Roboto/Roboto-Thin.ttf')
+}
+
+# default point size of each font
+FONT_SIZES = {
+    "weaselic" : 43,
+    "black": 40,
+    "bold": 35,
+    "medium": 40,
+    "light": 30,
+    "thin": 30
+}
+
+MIN_FONT_SIZE = 10
+
+# font sizes, margins and offsets are tuned for this frame size and scaled for other sizes
+BASE_FRAME_SIZE = (360, 740)
+
+# text colors in order of preference, each with the outline drawn around it
+TEXT_STYLES = [
+    ("yellow", "black"),
+    ("white", "black"),
+    ("red", "white"),
+    ("black", "white"),
+]
+TEXT_STYLE_RGB = {"yellow": (255, 255, 0), "white": (255, 255, 255), "red": (255, 0, 0), "black": (0, 0, 0)}
+
+# WCAG 2 minimum contrast ratio for large text; the first style reaching it is used
+MIN_CONTRAST_RATIO = 3.0
+
+# size of the downsampled buffer the background under the text is analyzed on
+ANALYSIS_SIZE = (64, 32)
+
+# sRGB value -> linear light, used for WCAG relative luminance
+_SRGB_TO_LINEAR = np.where(
+    np.arange(256) / 255 <= 0.04045,
+    np.arange(256) / 255 / 12.92,
+    ((np.arange(256) / 255 + 0.055) / 1.055) ** 2.4,
+)
+_LUMINANCE_WEIGHTS = np.array([0.2126, 0.7152, 0.0722])
+
+# text measurements only depend on the font, so one scratch canvas serves every layout
+_measure_draw = ImageDraw.Draw(Image.new('RGB', (1, 1)))
+
+
+@lru_cache(maxsize=None)
+def get_font(path, size):
+    """Load a TrueType font once per (path, size) for the whole process."""
+    return ImageFont.truetype(path, size)
+
+def preload_fonts(frame_sizes=(BASE_FRAME_SIZE,)):
+    """Load the title and item fonts at the point sizes add_text_to_image starts from for each frame size."""
+    for width, _ in frame_sizes:
+        scale = width / BASE_FRAME_SIZE[0]
+        for name in ("bold", "weaselic"):
+            get_font(FONT_PATHS[name], round(FONT_SIZES[name] * scale))
+
 def wrap_text(draw, text, font, max_width):
     words = text.split()
     lines = []
@@ -18,13 +89,13 @@ def wrap_text(draw, text, font, max_width):
     lines.append(current_line)
     return lines
 
-def draw_text_centered(draw, lines, position, font, max_width, padding, fill='yellow'):
+def draw_text_centered(draw, lines, position, font, max_width, padding, fill='yellow', stroke_fill=None, stroke_width=0):
     y = position[1]
 
     for line in lines:
         text_width = draw.textlength(line, font)
         x = position[0] + (max_width - text_width) // 2
-        draw.text((x, y), line, font=font, fill=fill)
+        draw.text((x, y), line, font=font, fill=fill, stroke_width=stroke_width, stroke_fill=stroke_fill)
         y += font.getsize('hg')[1] + padding
 
 def get_wrapped_text_size(draw, lines, font, padding):
@@ -33,120 +104,283 @@ def get_wrapped_text_size(draw, lines, font, padding):
     max_line_width = max(draw.textlength(line, font) for line in lines)
     return total_height, max_line_width
 
-def dynamically_adjust_font(draw, text, font, max_width, max_height, padding):
-    lines = wrap_text(draw, text, font, max_width)
-    total_height, _ = get_wrapped_text_size(draw, lines, font, padding)
-    while total_height > max_height and font.size > 10:
-        font = ImageFont.truetype(font.path, font.size - 1)
-        lines = wrap_text(draw, text, font, max_width)
-        total_height, _ = get_wrapped_text_size(draw, lines, font, padding)
-    return font, lines
+@lru_cache(maxsize=1024)
+def fit_text(text, font_path, font_size, max_width, max_height, padding):
+    """
+    Find the largest font size (at most font_size, at least MIN_FONT_SIZE) whose wrapped text fits the box.
+
+    Binary search over the size replaces shrinking one point at a time, and the result
+    is memoized per (text, font, box).
+
+    :return: (font size, tuple of wrapped lines)
+    """
+    def layout(size):
+        font = get_font(font_path, size)
+        lines = wrap_text(_measure_draw, text, font, max_width)
+        total_height, _ = get_wrapped_text_size(_measure_draw, lines, font, padding)
+        return tuple(lines), total_height
+
+    lines, total_height = layout(font_size)
+    if total_height <= max_height or font_size <= MIN_FONT_SIZE:
+        return font_size, lines
+
+    best_size, best_lines = MIN_FONT_SIZE, None
+    low, high = MIN_FONT_SIZE, font_size - 1
+    while low <= high:
+        size = (low + high) // 2
+        lines, total_height = layout(size)
+        if total_height <= max_height:
+            best_size, best_lines = size, lines
+            low = size + 1
+        else:
+            high = size - 1
 
+    if best_lines is None:
+        best_lines, _ = layout(MIN_FONT_SIZE)
+    return best_size, best_lines
 
-def is_image_dark(image,threshold=128):
-    """Determine if the image is predominantly dark, light or in the middle and return a suitable color for overlay"""
-    grayscale = image.convert('L')  # Convert to grayscale
-    stat = ImageStat.Stat(grayscale)
-    avg_brightness = stat.mean[0]
 
-    if avg_brightness < threshold:
-        return ('dark','yellow')
-    else:
-        return ('light','red')
-    
+def relative_luminance(rgb):
+    """WCAG relative luminance (0..1) of uint8 RGB values, for arrays of shape (..., 3)."""
+    return _SRGB_TO_LINEAR[np.asarray(rgb, dtype=np.uint8)] @ _LUMINANCE_WEIGHTS
 
-def add_text_to_image(image_path, text, is_title=True, save_to=None):
-    # Load the image
-    image = Image.open(image_path)
-
-    # Resize the image
-    resized_image = image.resize((360, 740))
-
-    # Get resized image dimensions
-    image_width, image_height = resized_image.size
-
-    # check if the image is more darker or more lighter
-    image_brightness_level = is_image_dark(resized_image)
-
-    # Create a drawing object
-    draw = ImageDraw.Draw(resized_image)
-
-    # setting up font_paths
-    font_paths = {
-        "weaselic" : os.path.join(constants.FONT_BASE_DIR,'Weaselic.ttf'),
-        "black": os.path.join(constants.FONT_BASE_DIR,'Roboto/Roboto-Black.ttf'),
-        "bold": os.path.join(constants.FONT_BASE_DIR,'Roboto/Roboto-Bold.ttf'),
-        "medium": os.path.join(constants.FONT_BASE_DIR,'Roboto/Roboto-Medium.ttf'),
-        "light": os.path.join(constants.FONT_BASE_DIR,'Roboto/Roboto-Light.ttf'),
-        "thin": os.path.join(constants.FONT_BASE_DIR,'Roboto/Roboto-Thin.ttf')
-    }
-
-    # Define fonts
-    fonts = {
-        "weaselic" : ImageFont.truetype(font_paths['weaselic'], 43),
-        "black": ImageFont.truetype(font_paths['black'], 40),
-        "bold": ImageFont.truetype(font_paths['bold'], 35),
-        "medium": ImageFont.truetype(font_paths['medium'], 40),
-        "light": ImageFont.truetype(font_paths['light'], 30),
-        "thin": ImageFont.truetype(font_paths['thin'], 30)
-    }
-
-    padding = 5
-    margin_between = 50  # Margin between title and description
-    safe_margin = 10  # Margin from the image edges
 
-    if is_title:
-        font = fonts["bold"]
-        max_width = image_width - 2 * safe_margin
-        max_height = (image_height - 2 * safe_margin) // 2
+def contrast_ratio(luminance_a, luminance_b):
+    """WCAG contrast ratio (1..21) between two relative luminances; works elementwise on arrays."""
+    lighter = np.maximum(luminance_a, luminance_b)
+    darker = np.minimum(luminance_a, luminance_b)
+    return (lighter + 0.05) / (darker + 0.05)
 
-        # Dynamically adjust font size and wrap text
-        font, lines = dynamically_adjust_font(draw, text, font, max_width, max_height, padding)
 
-        # Calculate total text height
-        total_height, _ = get_wrapped_text_size(draw, lines, font, padding)
+_STYLE_LUMINANCE = relative_luminance([TEXT_STYLE_RGB[fill] for fill, _ in TEXT_STYLES])
 
-        # Positioning
-        if total_height > image_height - 2 * safe_margin:
-            print("Text does not fit within the image boundaries.")
-        else:
-            position = (safe_margin, safe_margin + (image_height - total_height) // 2 - 120)
 
-            # Draw the rectangle behind the text
-            rect_x0 = safe_margin
-            rect_x1 = image_width - safe_margin
-            rect_y0 = position[1] - padding
-            rect_y1 = rect_y0 + total_height + 2 * padding
-            draw.rectangle([(rect_x0, rect_y0), (rect_x1, rect_y1)], fill="yellow")
+def sample_regions(images, boxes=None):
+    """
+    Downsample the region of each image that text will cover into one (N, h, w, 3) uint8 array.
+
+    Cropping and box-filter resizing happen in a single PIL call per frame, so the
+    full-resolution image is never converted or copied.
+
+    :param images: PIL images
+    :param boxes: (x0, y0, x1, y1) per image, or None for the whole image
+    """
+    boxes = boxes or [None] * len(images)
+    samples = []
+    for image, box in zip(images, boxes):
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        samples.append(np.asarray(image.resize(ANALYSIS_SIZE, Image.BOX, box=box)))
+    return np.stack(samples)
+
+
+def choose_text_styles(images, boxes=None):
+    """
+    Pick a (fill, stroke) color pair per image for text drawn over the given boxes.
+
+    Luminance is computed on the downsampled region under the text only. Each style is
+    scored by its WCAG contrast against both the dark and the bright end of that region
+    (10th and 90th percentile), so text over a bright patch of a dark image stays
+    readable. The first style in TEXT_STYLES reaching MIN_CONTRAST_RATIO wins, otherwise
+    the one with the best contrast. All frames are scored in one vectorized pass.
+
+    :param images: PIL images
+    :param boxes: (x0, y0, x1, y1) text bounding box per image, or None for the whole image
+    :return: list of (fill, stroke) color names
+    """
+    luminance = relative_luminance(sample_regions(images, boxes))
+    flat = luminance.reshape(len(luminance), -1)
+    low, high = np.percentile(flat, [10, 90], axis=1)
+
+    # (frames, styles): worst-case contrast of each style against its background
+    ratios = np.minimum(
+        contrast_ratio(_STYLE_LUMINANCE[None, :], low[:, None]),
+        contrast_ratio(_STYLE_LUMINANCE[None, :], high[:, None]),
+    )
+    good_enough = ratios >= MIN_CONTRAST_RATIO
+    choice = np.where(good_enough.any(axis=1), good_enough.argmax(axis=1), ratios.argmax(axis=1))
+    return [TEXT_STYLES[index] for index in choice]
+
+
+def choose_text_style(image, box=None):
+    """(fill, stroke) colors for text drawn over box of a single image, see choose_text_styles."""
+    return choose_text_styles([image], [box])[0]
+
 
-            # Draw wrapped and centered text
-            draw_text_centered(draw, lines, (safe_margin, rect_y0 + padding), font, rect_x1 - rect_x0, padding, fill='black')
+# resampling filter used to fit generated images to frame sizes
+DEFAULT_RESAMPLE = Image.LANCZOS
 
+
+class TextLayout(NamedTuple):
+    """Where and how the text of one frame is drawn; depends only on the text, its kind and the frame size."""
+    font_path: str
+    font_size: int
+    lines: tuple
+    position: tuple  # top-left of the text column
+    max_width: int  # width the lines are centered in
+    padding: int
+    text_box: tuple  # (x0, y0, x1, y1) covered by the text, analyzed for the color choice
+    background_box: Optional[tuple]  # yellow box behind the title, None for items
+    stroke_width: int
+
+
+def fit_frame(image, size, resample=DEFAULT_RESAMPLE):
+    """Center-crop image to the aspect ratio of size and resize it, in one resampling step."""
+    if image.size == tuple(size):
+        return image.copy()
+    return ImageOps.fit(image, size, resample)
+
+
+@lru_cache(maxsize=1024)
+def layout_text(text, is_title, size):
+    """
+    Compute the text layout for a frame size, or None if the text cannot fit.
+
+    Font sizes, margins and offsets are scaled from the BASE_FRAME_SIZE layout, and the
+    result is memoized, so every frame of every profile is laid out once.
+    """
+    image_width, image_height = size
+    scale = image_width / BASE_FRAME_SIZE[0]
+
+    padding = round(5 * scale)
+    safe_margin = round(10 * scale)  # Margin from the image edges
+    title_offset = round(120 * image_height / BASE_FRAME_SIZE[1])  # how far the title sits above the center
+    max_width = image_width - 2 * safe_margin
+    max_height = (image_height - 2 * safe_margin) // 2
+
+    font_name = "bold" if is_title else "weaselic"
+    font_path = FONT_PATHS[font_name]
+
+    # Dynamically adjust font size and wrap text
+    font_size, lines = fit_text(text, font_path, round(FONT_SIZES[font_name] * scale), max_width, max_height, padding)
+
+    # Calculate total text height
+    total_height, text_width = get_wrapped_text_size(_measure_draw, lines, get_font(font_path, font_size), padding)
+    if total_height > image_height - 2 * safe_margin:
+        print("Text does not fit within the image boundaries.")
+        return None
+
+    if is_title:
+        # the title sits in a yellow box spanning the frame, above the center
+        rect_y0 = safe_margin + (image_height - total_height) // 2 - title_offset - padding
+        background_box = (safe_margin, rect_y0, image_width - safe_margin, rect_y0 + total_height + 2 * padding)
+        position = (safe_margin, rect_y0 + padding)
+        text_box = background_box
+        stroke_width = 0
     else:
-        font = fonts["weaselic"]
-        max_width = image_width - 2 * safe_margin
-        max_height = (image_height - 2 * safe_margin) // 2
+        position = (safe_margin, safe_margin + (image_height - total_height) // 2)
+        text_x0 = safe_margin + (max_width - text_width) // 2
+        text_box = (text_x0, position[1], text_x0 + text_width, position[1] + total_height)
+        background_box = None
+        stroke_width = max(1, round(2 * scale))
+
+    return TextLayout(font_path, font_size, lines, position, max_width, padding, text_box, background_box, stroke_width)
+
+
+def draw_layout(image, layout, style=None):
+    """Draw a TextLayout onto image in place; style is the (fill, stroke) pair for item text."""
+    draw = ImageDraw.Draw(image)
+    font = get_font(layout.font_path, layout.font_size)
+    if layout.background_box:
+        # Draw the rectangle behind the text
+        x0, y0, x1, y1 = layout.background_box
+        draw.rectangle([(x0, y0), (x1, y1)], fill="yellow")
+        draw_text_centered(draw, layout.lines, layout.position, font, layout.max_width, layout.padding, fill='black')
+    else:
+        fill, stroke = style
+        draw_text_centered(draw, layout.lines, layout.position, font, layout.max_width, layout.padding, fill=fill,
+                           stroke_fill=stroke, stroke_width=layout.stroke_width)
+    return image
 
-        # Dynamically adjust font size and wrap text
-        font, lines = dynamically_adjust_font(draw, text, font, max_width, max_height, padding)
 
-        # Calculate total text height
-        total_height, _ = get_wrapped_text_size(draw, lines, font, padding)
+def add_text_to_image(image_path, text, is_title=True, save_to=None, size=BASE_FRAME_SIZE, resample=DEFAULT_RESAMPLE):
+    """
+    Fit an image to a frame size and draw the title or item text on it.
 
-        # Positioning
-        if total_height > image_height - 2 * safe_margin:
-            print("Text does not fit within the image boundaries.")
-        else:
-            position = (safe_margin, safe_margin + (image_height - total_height) // 2)
+    :param image_path: image file path or an already loaded PIL image
+    :param size: (width, height) of the frame; the text layout is computed for this size
+    :param resample: PIL resampling filter used to fit the image
+    :return: the new frame (PIL image)
+    """
+    # Load the image
+    image = image_path if isinstance(image_path, Image.Image) else Image.open(image_path)
+
+    # Crop and resize the image to the frame
+    resized_image = fit_frame(image, size, resample)
 
-            # Draw wrapped and centered text
-            description_color =  image_brightness_level[1]
-            draw_text_centered(draw, lines, position, font, max_width, padding,fill = description_color)
+    layout = layout_text(text, is_title, tuple(resized_image.size))
+    if layout is not None:
+        # item text colors come from the background right under the text
+        style = None if is_title else choose_text_style(resized_image, layout.text_box)
+        draw_layout(resized_image, layout, style)
 
     # Save the image if save_to is provided
     if save_to:
         resized_image.save(save_to)
 
+    return resized_image
+
+
+def _rasterize(frame, layout, style):
+    """Process pool task: draw one layout onto an RGB array and return the array."""
+    image = Image.fromarray(frame)
+    if layout is not None:
+        draw_layout(image, layout, style)
+    return np.asarray(image)
+
+
+_overlay_executor = None
+_overlay_executor_lock = threading.Lock()
+
+
+def get_overlay_executor():
+    """Process pool shared by overlay_frames calls, or None when constants.OVERLAY_PROCESSES is 1 or less (draw inline)."""
+    global _overlay_executor
+    with _overlay_executor_lock:
+        # daemonic processes (e.g. job_queue workers) cannot start a pool of their own
+        if _overlay_executor is None and constants.OVERLAY_PROCESSES > 1 and not multiprocessing.current_process().daemon:
+            # spawn keeps workers from inheriting locks held by the generator's threads
+            _overlay_executor = ProcessPoolExecutor(max_workers=constants.OVERLAY_PROCESSES,
+                                                    mp_context=multiprocessing.get_context('spawn'))
+        return _overlay_executor
+
+
+def overlay_frames(jobs, resample=DEFAULT_RESAMPLE, executor=None):
+    """
+    Overlay text on many frames at once, e.g. every frame and profile of a short or of a batch of shorts.
+
+    All layouts are computed up front (memoized per text, kind and size), every image is
+    fitted with the same resampling filter, and the text colors of all item frames are
+    chosen in one vectorized choose_text_styles call. Drawing is then fanned out over
+    executor (a process pool, see get_overlay_executor) or done inline when it is None.
+
+    :param jobs: (image, text, is_title, size) tuples; image is a file path, PIL image or RGB array
+    :param resample: PIL resampling filter used for every frame
+    :param executor: concurrent.futures executor the text is rasterized in
+    :return: list of HxWx3 uint8 RGB arrays in job order
+    """
+    frames, layouts = [], []
+    for image, text, is_title, size in jobs:
+        if isinstance(image, np.ndarray):
+            image = Image.fromarray(image)
+        elif not isinstance(image, Image.Image):
+            image = Image.open(image)
+        frames.append(fit_frame(image.convert('RGB'), tuple(size), resample))
+        layouts.append(layout_text(text, is_title, tuple(size)))
+
+    styles = [None] * len(jobs)
+    items = [index for index, (_, _, is_title, _) in enumerate(jobs) if not is_title and layouts[index] is not None]
+    if items:
+        chosen = choose_text_styles([frames[index] for index in items], [layouts[index].text_box for index in items])
+        for index, style in zip(items, chosen):
+            styles[index] = style
+
+    buffers = [np.asarray(frame) for frame in frames]
+    if executor is None:
+        return [_rasterize(buffer, layout, style) for buffer, layout, style in zip(buffers, layouts, styles)]
+    return list(executor.map(_rasterize, buffers, layouts, styles))
+
+
 # Example usage:
 if __name__ == '__main__':
     title_text = "Top 5 mountains in the world"
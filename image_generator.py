@@ -1,36 +1,213 @@
+import hashlib
+import threading
 import constants
 from PIL import Image
-from gradio_client import Client
+from media_cache import MediaCache
+from resilience import get_policy
+from instrumentation import count, count_file_bytes, span
 
 
-class ImageGenerator:     
+def reconnect_errors():
+    """Errors that mean the connection to the Space is gone and a fresh client may succeed."""
+    # httpx comes with gradio_client; it is imported on first failure rather than at startup
+    import httpx
+    return (httpx.TransportError, ConnectionError)
 
-    def generate_image(self, prompt, path='test_image.png'):
+
+def gradio_client_factory(space_name, hf_token=None):
+    """Default client factory; gradio_client (and httpx) are only imported when the first client is built."""
+    from gradio_client import Client
+    return Client(space_name, hf_token=hf_token)
+
+
+class GradioClientPool:
+    """
+    Lazily creates and reuses Gradio clients for a single Space.
+
+    Building a ``Client`` performs the Space handshake and fetches the API schema,
+    so clients are created on first use and then shared across calls (and, through
+    ``get_client_pool``, across Streamlit sessions in the same process).
+    """
+
+    def __init__(self, space_name, hf_token=None, size=1, client_factory=None):
+        """
+        :param space_name: Hugging Face Space name or URL of the Gradio app
+        :param hf_token: Hugging Face token passed to every client
+        :param size: maximum number of clients kept open, handed out round-robin
+        :param client_factory: callable(space_name, hf_token=...) returning a client, defaults to gradio_client.Client via gradio_client_factory
+        """
+        self.space_name = space_name
+        self.hf_token = hf_token
+        self.size = max(1, size)
+        self.client_factory = client_factory or gradio_client_factory
+        self._clients = []
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def _create_client(self):
+        print(f"Connecting to {self.space_name}...")
+        return self.client_factory(self.space_name, hf_token=self.hf_token)
+
+    @staticmethod
+    def _is_healthy(client):
+        """A gradio client stops its heartbeat thread once the connection to the Space drops."""
+        heartbeat = getattr(client, 'heartbeat', None)
+        return heartbeat is None or heartbeat.is_alive()
+
+    def get_client(self):
+        with self._lock:
+            # drop clients whose connection has died since they were last used
+            for client in [c for c in self._clients if not self._is_healthy(c)]:
+                self._discard(client)
+
+            if len(self._clients) < self.size:
+                client = self._create_client()
+                self._clients.append(client)
+                return client
+
+            client = self._clients[self._next % len(self._clients)]
+            self._next += 1
+            return client
+
+    def discard(self, client):
+        with self._lock:
+            self._discard(client)
+
+    def _discard(self, client):
+        if client in self._clients:
+            self._clients.remove(client)
+        close = getattr(client, 'close', None)
+        if close:
+            try:
+                close()
+            except Exception as e:
+                print(f"Error while closing gradio client: {e}")
+
+    def predict(self, **kwargs):
+        """Run ``predict`` on a pooled client, reconnecting once if the connection has failed."""
+        client = self.get_client()
+        try:
+            return client.predict(**kwargs)
+        except Exception as e:
+            if not isinstance(e, reconnect_errors()):
+                raise
+            print(f"Gradio client connection failed ({e}), reconnecting...")
+            count('image.reconnect')
+            self.discard(client)
+            return self.get_client().predict(**kwargs)
+
+    def close(self):
+        with self._lock:
+            for client in list(self._clients):
+                self._discard(client)
+
+
+_client_pools = {}
+_client_pools_lock = threading.Lock()
+
+
+def get_client_pool(space_name=constants.IMAGE_GENERATION_SPACE_NAME, hf_token=constants.HF_TOKEN):
+    """Return the process-wide client pool for a Space, creating it on first use."""
+    with _client_pools_lock:
+        pool = _client_pools.get((space_name, hf_token))
+        if pool is None:
+            pool = GradioClientPool(space_name, hf_token=hf_token, size=constants.IMAGE_GENERATION_CLIENT_POOL_SIZE)
+            _client_pools[(space_name, hf_token)] = pool
+        return pool
+
+
+_image_cache = None
+
+
+def get_image_cache():
+    """Return the process-wide generated image cache, or None when caching is disabled."""
+    global _image_cache
+    if _image_cache is None and constants.IMAGE_CACHE_MAX_BYTES > 0:
+        _image_cache = MediaCache(constants.IMAGE_CACHE_DIR, constants.IMAGE_CACHE_MAX_BYTES, extension='.png')
+    return _image_cache
+
+
+class ImageGenerator:
+
+    def __init__(self, client_pool=None, cache=None, policy=None, placeholder_fallback=None):
+        """
+        :param client_pool: GradioClientPool to send requests through, defaults to the shared pool for the configured Space
+        :param cache: MediaCache for generated images, defaults to the shared cache (None if disabled in constants)
+        :param policy: ResiliencePolicy for the Space calls, defaults to the shared 'image' policy
+        :param placeholder_fallback: write a placeholder when the Space keeps failing (returned as {"error": ..., "placeholder": path}),
+            defaults to constants.IMAGE_PLACEHOLDER_FALLBACK
+        """
+        self.client_pool = client_pool or get_client_pool()
+        self.cache = cache if cache is not None else get_image_cache()
+        self.policy = policy or get_policy('image')
+        self.placeholder_fallback = constants.IMAGE_PLACEHOLDER_FALLBACK if placeholder_fallback is None else placeholder_fallback
+
+    def generate_image(self, prompt, path='test_image.png', width=720, height=1280, seed=None):
+        with span('image', path=path, width=width, height=height) as attributes:
+            result = self._generate_image(prompt, path, width, height, seed)
+            attributes['error'] = isinstance(result, dict) and "error" in result
+            attributes['placeholder'] = isinstance(result, dict) and "placeholder" in result
+            return result
+
+    def _generate_image(self, prompt, path, width, height, seed):
         try:
-            # Initialize the Gradio Client with Hugging Face token
-            client = Client(constants.IMAGE_GENERATION_SPACE_NAME, hf_token=constants.HF_TOKEN)
+            # identical requests to the same Space are served from the local cache
+            cache_key = None
+            if self.cache is not None:
+                cache_key = MediaCache.make_key(self.client_pool.space_name, prompt, width, height, seed)
+                cached_path = self.cache.get(cache_key, dest_path=path)
+                if cached_path:
+                    count('image.cache_hit')
+                    count_file_bytes('bytes.image', path)
+                    print(f"Image cache hit for prompt: {prompt[:50]}")
+                    return cached_path
 
-            # Make the API request
-            result = client.predict(
-    		prompt=prompt,
-    		width=720,
-    		height=1280,
-    		api_name="/generate_image")
+            # only forward a seed to Spaces that were asked for one
+            seed_kwargs = {} if seed is None else {"seed": seed}
+
+            # Make the API request through a pooled Gradio client, with the timeouts, retries and circuit breaker of the image policy
+            fallback = (lambda error: error) if self.placeholder_fallback else None
+            result = self.policy.call(self._predict, prompt, width, height, seed_kwargs, fallback=fallback)
+            if isinstance(result, Exception):
+                # the Space is down or kept failing; a placeholder keeps the short renderable, but it is
+                # reported as a failure of this image and never cached, so a rerun asks the Space again
+                self.write_placeholder(prompt, path, width, height)
+                count('image.placeholder')
+                return {"error": f"{type(result).__name__}: {result}", "placeholder": path}
 
             image = Image.open(result)
             image.save(path)
+            count('image.generated')
+            count_file_bytes('bytes.image', path)
+
+            if cache_key:
+                self.cache.put(cache_key, path)
 
             # Return the result (which includes the URL or file path)
             return result
 
         except Exception as e:
             print(f"Error during image generation: {e}")
+            count('image.error')
             return {"error": str(e)}
 
+    def _predict(self, prompt, width, height, seed_kwargs):
+        return self.client_pool.predict(prompt=prompt, width=width, height=height, api_name="/generate_image", **seed_kwargs)
+
+    @staticmethod
+    def write_placeholder(prompt, path, width, height):
+        """Write a dark vertical gradient tinted by the prompt, so light overlay text stays readable on it."""
+        import numpy as np
+
+        tint = np.array(list(hashlib.sha256(prompt.encode('utf-8')).digest()[:3]), dtype=np.float32) / 255
+        shade = np.linspace(0.35, 0.05, height, dtype=np.float32)[:, None, None]
+        pixels = (shade * (0.4 + 0.6 * tint) * 255).astype(np.uint8)
+        Image.fromarray(np.broadcast_to(pixels, (height, width, 3))).save(path)
+
 
 # Example usage
 if __name__ == '__main__':
     image_generator = ImageGenerator()  # You can pass custom params here if needed
     result = image_generator.generate_image("A cat with flowers around it.",path='wow9.png')
-    
+
     print(result)
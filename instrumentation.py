@@ -0,0 +1,152 @@
+"""
+Timing spans and counters for the generation pipeline.
+
+A Tracer collects one span per stage and per item plus counters (cache hits, retries,
+bytes written). Finished spans are kept in memory and, when a trace file is configured,
+appended as JSON lines shaped like OpenTelemetry span records.
+
+Service code does not need a tracer handed to it: ``span`` and ``count`` report to the
+tracer activated for the current context, and do nothing when there is none. Work
+submitted to thread pools keeps that context when it is wrapped with ``bind``.
+"""
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+import constants
+
+
+_current_tracer = contextvars.ContextVar('tracer', default=None)
+_current_span_id = contextvars.ContextVar('span_id', default=None)
+
+
+class Tracer:
+
+    def __init__(self, trace_path=None, listeners=None):
+        """
+        :param trace_path: JSON lines file spans are appended to, defaults to constants.TRACE_FILE (None disables it)
+        :param listeners: callables invoked with each finished span record
+        """
+        self.trace_id = uuid.uuid4().hex
+        self.trace_path = trace_path if trace_path is not None else constants.TRACE_FILE
+        self.listeners = list(listeners or [])
+        self.spans = []
+        self.counters = defaultdict(int)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def activate(self):
+        """Make this tracer the target of the module-level span() and count() helpers."""
+        token = _current_tracer.set(self)
+        try:
+            yield self
+        finally:
+            _current_tracer.reset(token)
+
+    @contextmanager
+    def span(self, name, **attributes):
+        """Time a block of work; nested spans record this one as their parent."""
+        span_id = uuid.uuid4().hex[:16]
+        parent_id = _current_span_id.get()
+        token = _current_span_id.set(span_id)
+        start_ns = time.time_ns()
+        status = {"code": "OK"}
+        try:
+            yield attributes
+        except BaseException as e:
+            status = {"code": "ERROR", "message": f"{type(e).__name__}: {e}"}
+            raise
+        finally:
+            _current_span_id.reset(token)
+            end_ns = time.time_ns()
+            self._record({
+                "traceId": self.trace_id,
+                "spanId": span_id,
+                "parentSpanId": parent_id,
+                "name": name,
+                "startTimeUnixNano": start_ns,
+                "endTimeUnixNano": end_ns,
+                "durationMs": round((end_ns - start_ns) / 1e6, 3),
+                "attributes": attributes,
+                "status": status,
+            })
+
+    def count(self, name, value=1):
+        with self._lock:
+            self.counters[name] += value
+
+    def _record(self, record):
+        with self._lock:
+            self.spans.append(record)
+            if self.trace_path:
+                with open(self.trace_path, 'a', encoding='utf-8') as trace_file:
+                    trace_file.write(json.dumps(record, default=str) + "\n")
+        for listener in self.listeners:
+            try:
+                listener(record)
+            except Exception as e:
+                print(f"Trace listener failed: {e}")
+
+    def write_counters(self):
+        """Append the counters as one metrics record to the trace file and return it."""
+        with self._lock:
+            record = {"traceId": self.trace_id, "name": "counters", "timeUnixNano": time.time_ns(), "counters": dict(self.counters)}
+            if self.trace_path:
+                with open(self.trace_path, 'a', encoding='utf-8') as trace_file:
+                    trace_file.write(json.dumps(record) + "\n")
+        return record
+
+    def stage_breakdown(self):
+        """Seconds spent per stage span (spans started through the ``stage`` decorator)."""
+        with self._lock:
+            breakdown = defaultdict(float)
+            for record in self.spans:
+                if record["attributes"].get("kind") == "stage":
+                    breakdown[record["name"]] += record["durationMs"] / 1000
+            return dict(breakdown)
+
+
+def current_tracer():
+    return _current_tracer.get()
+
+
+def span(name, **attributes):
+    """Span on the active tracer, or a no-op when nothing is being traced."""
+    tracer = _current_tracer.get()
+    return tracer.span(name, **attributes) if tracer else nullcontext(attributes)
+
+
+def count(name, value=1):
+    """Increment a counter on the active tracer, if any."""
+    tracer = _current_tracer.get()
+    if tracer:
+        tracer.count(name, value)
+
+
+def count_file_bytes(name, path):
+    """Add the size of a written file to a byte counter, e.g. count_file_bytes('bytes.image', path)."""
+    tracer = _current_tracer.get()
+    if tracer and os.path.exists(path):
+        tracer.count(name, os.path.getsize(path))
+
+
+def bind(fn):
+    """Wrap fn so it runs in a copy of the caller's context (active tracer and parent span), for thread pools."""
+    context = contextvars.copy_context()
+    return functools.partial(context.run, fn)
+
+
+def stage(name):
+    """Decorator for YoutubeShortGenerator stage methods: activate self.tracer and time the call as a stage span."""
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with self.tracer.activate(), self.tracer.span(name, kind="stage"):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorator
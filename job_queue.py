@@ -0,0 +1,342 @@
+"""
+SQLite-backed job queue and local worker pool for video generation.
+
+The Streamlit app submits titles here instead of rendering inside the script thread.
+Worker processes claim queued jobs, run YoutubeShortGenerator.generate_streaming and
+write the status and per-stage progress back to the database, which the UI polls.
+No broker is needed and jobs survive browser refreshes and app reruns.
+
+Identical titles that are still queued or running share one job. A running job sends a
+heartbeat every few seconds; a job whose worker died (its process is gone, or its
+heartbeat stopped) is requeued with the same run_id, and a title submitted again after a
+failed job gets that job's run_id, so the rerun resumes from its checkpoints.
+"""
+import json
+import multiprocessing
+import os
+import socket
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+from contextlib import closing
+import constants
+from run_manifest import validate_run_id
+
+
+QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    normalized_title TEXT NOT NULL,
+    status TEXT NOT NULL,
+    stage TEXT,
+    progress TEXT,
+    run_id TEXT,
+    video_path TEXT,
+    error TEXT,
+    worker TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at);
+CREATE INDEX IF NOT EXISTS jobs_title ON jobs (normalized_title, status);
+"""
+
+
+def worker_id(pid=None):
+    """Identifies the worker process running a job, unique across machines sharing the database."""
+    return f"{socket.gethostname()}:{pid or os.getpid()}"
+
+
+def _pid_alive(pid):
+    if os.name == 'nt':
+        return True  # os.kill would terminate the process; stale jobs are caught by their heartbeat instead
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # exists, but belongs to another user
+    return True
+
+
+class JobQueue:
+
+    def __init__(self, db_path=None):
+        """
+        :param db_path: SQLite database file, defaults to constants.JOB_DB_PATH
+        """
+        self.db_path = db_path or constants.JOB_DB_PATH
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        with closing(self._connect()) as connection:
+            connection.executescript(_SCHEMA)
+            # databases created before jobs recorded their worker
+            columns = {row['name'] for row in connection.execute("PRAGMA table_info(jobs)")}
+            if 'worker' not in columns:
+                try:
+                    connection.execute("ALTER TABLE jobs ADD COLUMN worker TEXT")
+                except sqlite3.OperationalError:
+                    pass  # added concurrently by another process
+
+    def _connect(self):
+        # one short-lived connection per call keeps this safe across threads and processes
+        connection = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        connection.row_factory = sqlite3.Row
+        connection.execute("PRAGMA journal_mode=WAL")
+        return connection
+
+    @staticmethod
+    def _to_dict(row):
+        if row is None:
+            return None
+        job = dict(row)
+        job['progress'] = json.loads(job['progress']) if job['progress'] else {}
+        return job
+
+    def submit(self, title, run_id=None):
+        """
+        Queue a title and return its job ID, reusing the ID of an identical queued or running job.
+
+        :param run_id: run to resume; defaults to the run of the latest failed job for the same title
+        """
+        from youtube_short_generator import normalize_title
+
+        if run_id is not None:
+            validate_run_id(run_id)
+        normalized = normalize_title(title)
+        now = time.time()
+        connection = self._connect()
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            row = connection.execute(
+                "SELECT id FROM jobs WHERE normalized_title = ? AND status IN (?, ?) ORDER BY created_at LIMIT 1",
+                (normalized, QUEUED, RUNNING),
+            ).fetchone()
+            if row:
+                connection.execute("COMMIT")
+                return row['id']
+
+            if run_id is None:
+                # a failed run left its finished assets checkpointed, so retrying picks them up
+                failed = connection.execute(
+                    "SELECT run_id FROM jobs WHERE normalized_title = ? AND status = ? ORDER BY created_at DESC LIMIT 1",
+                    (normalized, FAILED),
+                ).fetchone()
+                run_id = failed['run_id'] if failed else None
+
+            job_id = uuid.uuid4().hex
+            connection.execute(
+                "INSERT INTO jobs (id, title, normalized_title, status, run_id, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, title, normalized, QUEUED, run_id, now, now),
+            )
+            connection.execute("COMMIT")
+            return job_id
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        finally:
+            connection.close()
+
+    def claim(self, worker=None):
+        """
+        Atomically take the oldest queued job and mark it running; returns None if the queue is empty.
+
+        Stale running jobs are requeued first, so jobs of crashed workers are picked up again
+        by whichever worker polls next.
+
+        :param worker: worker_id of the claiming process, defaults to the current one
+        """
+        connection = self._connect()
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            self._requeue(connection, "updated_at < ?", (time.time() - constants.JOB_STALE_SECONDS,))
+            row = connection.execute(
+                "SELECT * FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1", (QUEUED,)
+            ).fetchone()
+            if row is None:
+                connection.execute("COMMIT")
+                return None
+            run_id = row['run_id'] or uuid.uuid4().hex
+            connection.execute(
+                "UPDATE jobs SET status = ?, run_id = ?, worker = ?, updated_at = ? WHERE id = ?",
+                (RUNNING, run_id, worker or worker_id(), time.time(), row['id']),
+            )
+            connection.execute("COMMIT")
+            job = self._to_dict(row)
+            job.update(status=RUNNING, run_id=run_id, worker=worker or worker_id())
+            return job
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        finally:
+            connection.close()
+
+    def update(self, job_id, **fields):
+        if 'progress' in fields:
+            fields['progress'] = json.dumps(fields['progress'])
+        fields['updated_at'] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with closing(self._connect()) as connection:
+            connection.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+    def heartbeat(self, job_id, worker):
+        """Mark a running job as alive; returns False once the job is no longer this worker's (e.g. requeued)."""
+        with closing(self._connect()) as connection:
+            cursor = connection.execute(
+                "UPDATE jobs SET updated_at = ? WHERE id = ? AND status = ? AND worker = ?",
+                (time.time(), job_id, RUNNING, worker),
+            )
+            return cursor.rowcount == 1
+
+    def get(self, job_id):
+        with closing(self._connect()) as connection:
+            return self._to_dict(connection.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone())
+
+    @staticmethod
+    def _requeue(connection, condition, parameters):
+        cursor = connection.execute(
+            f"UPDATE jobs SET status = ?, worker = NULL, updated_at = ? WHERE status = ? AND {condition}",
+            (QUEUED, time.time(), RUNNING, *parameters),
+        )
+        return cursor.rowcount
+
+    def requeue_stale(self, max_age=None):
+        """Put running jobs whose heartbeat has been silent for max_age seconds back in the queue."""
+        max_age = max_age or constants.JOB_STALE_SECONDS
+        with closing(self._connect()) as connection:
+            return self._requeue(connection, "updated_at < ?", (time.time() - max_age,))
+
+    def requeue_worker(self, worker):
+        """Put the jobs of a worker that is known to be dead back in the queue."""
+        with closing(self._connect()) as connection:
+            return self._requeue(connection, "worker = ?", (worker,))
+
+    def requeue_orphans(self):
+        """Put running jobs of worker processes on this host that no longer exist (e.g. after a restart) back in the queue."""
+        host = socket.gethostname()
+        with closing(self._connect()) as connection:
+            workers = [row['worker'] for row in connection.execute(
+                "SELECT DISTINCT worker FROM jobs WHERE status = ? AND worker LIKE ?", (RUNNING, f"{host}:%"))]
+        requeued = 0
+        for worker in workers:
+            pid = worker.rsplit(':', 1)[1]
+            if pid.isdigit() and not _pid_alive(int(pid)):
+                requeued += self.requeue_worker(worker)
+        return requeued
+
+
+def run_job(queue, job):
+    """Render one claimed job, reporting each finished stage to the queue."""
+    from instrumentation import Tracer
+    from youtube_short_generator import YoutubeShortGenerator
+
+    tracer = Tracer()
+
+    def on_span(record):
+        if record["attributes"].get("kind") == "stage":
+            progress = {stage: round(seconds, 2) for stage, seconds in tracer.stage_breakdown().items()}
+            queue.update(job['id'], stage=record["name"], progress=progress)
+
+    tracer.listeners.append(on_span)
+
+    # stages can take many minutes, so liveness is reported separately from progress
+    finished = threading.Event()
+
+    def heartbeat():
+        while not finished.wait(constants.JOB_HEARTBEAT_SECONDS):
+            if not queue.heartbeat(job['id'], job['worker']):
+                print(f"Job {job['id']} is no longer assigned to this worker")
+                return
+
+    threading.Thread(target=heartbeat, name='job-heartbeat', daemon=True).start()
+    generator = YoutubeShortGenerator(tracer=tracer, run_id=job['run_id'])
+    try:
+        generator.generate_streaming(job['title'])
+        # a video with placeholder images is done, but its error says which images to regenerate
+        placeholders = ", ".join(f"{name}.png ({error})" for name, error in sorted(generator.image_placeholders.items()))
+        queue.update(job['id'], status=DONE, stage='done', video_path=generator.video_path,
+                     error=f"Placeholder images: {placeholders}" if placeholders else None)
+    except Exception as e:
+        traceback.print_exc()
+        queue.update(job['id'], status=FAILED, error=f"{type(e).__name__}: {e}")
+    finally:
+        finished.set()
+
+
+def worker_loop(db_path, poll_interval=None):
+    """Claim and run jobs forever (target of each worker process)."""
+    from youtube_short_generator import warmup
+
+    poll_interval = poll_interval or constants.JOB_POLL_SECONDS
+    queue = JobQueue(db_path)
+    # initialize clients, fonts and the LLM graph before the first job is claimed
+    warmup()
+    while True:
+        job = queue.claim(worker_id())
+        if job is None:
+            time.sleep(poll_interval)
+            continue
+        print(f"Worker {os.getpid()} running job {job['id']}: {job['title']}")
+        run_job(queue, job)
+
+
+class WorkerPool:
+    """A fixed number of worker processes consuming a JobQueue; dead workers are replaced by ensure_running."""
+
+    def __init__(self, db_path=None, workers=None):
+        self.db_path = db_path or constants.JOB_DB_PATH
+        self.workers = workers or constants.JOB_WORKERS
+        self.processes = []
+        self._lock = threading.Lock()
+
+    def _spawn(self):
+        process = multiprocessing.get_context('spawn').Process(target=worker_loop, args=(self.db_path,), daemon=True)
+        process.start()
+        return process
+
+    def start(self):
+        # jobs of workers that died with the previous server process would otherwise block their title until stale
+        queue = JobQueue(self.db_path)
+        queue.requeue_orphans()
+        queue.requeue_stale()
+        with self._lock:
+            self.processes = [self._spawn() for _ in range(self.workers)]
+        return self
+
+    def ensure_running(self):
+        """Requeue the jobs of worker processes that died and start replacements; cheap enough to call on every poll."""
+        with self._lock:
+            if not self.processes:
+                return 0
+            queue = None
+            replaced = 0
+            for index, process in enumerate(self.processes):
+                if process.is_alive():
+                    continue
+                queue = queue or JobQueue(self.db_path)
+                requeued = queue.requeue_worker(worker_id(process.pid))
+                print(f"Worker {process.pid} exited ({process.exitcode}), requeued {requeued} job(s) and starting a replacement")
+                self.processes[index] = self._spawn()
+                replaced += 1
+            return replaced
+
+    def stop(self):
+        with self._lock:
+            for process in self.processes:
+                process.terminate()
+            for process in self.processes:
+                process.join()
+            self.processes = []
+
+
+if __name__ == '__main__':
+    # Run standalone workers, e.g. on a separate machine sharing the database file
+    print(f"Starting {constants.JOB_WORKERS} worker(s) on {constants.JOB_DB_PATH}")
+    pool = WorkerPool().start()
+    while True:
+        time.sleep(constants.JOB_POLL_SECONDS)
+        pool.ensure_running()
@@ -0,0 +1,119 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+
+
+class MediaCache:
+    """
+    Content-addressed on-disk cache for generated media files.
+
+    Entries are stored under the SHA-256 of their key parts, written atomically
+    (temp file + rename) and evicted least-recently-used first once the cache
+    grows past ``max_bytes``.
+    """
+
+    def __init__(self, cache_dir, max_bytes, extension='.png'):
+        """
+        :param cache_dir: directory the cached files are stored in
+        :param max_bytes: total size the cache is trimmed back to after each write
+        :param extension: file extension of the cached files
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.extension = extension
+        self._lock = threading.Lock()
+        self._total_bytes = None
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(*parts):
+        """Hash the given parts into a cache key, so that (prompt, size, ...) maps to a stable file name."""
+        digest = hashlib.sha256()
+        for part in parts:
+            digest.update(repr(part).encode('utf-8'))
+            digest.update(b'\0')
+        return digest.hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + self.extension)
+
+    def _entries(self):
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.endswith(self.extension):
+                    yield os.path.join(root, name)
+
+    def get(self, key, dest_path=None):
+        """
+        Look up a cached file.
+
+        :param key: key returned by make_key
+        :param dest_path: if given, the cached file is copied here
+        :return: path of the cached file (or dest_path), or None on a miss
+        """
+        entry = self._entry_path(key)
+        try:
+            # refresh the modification time so eviction treats this entry as recently used
+            os.utime(entry)
+            if dest_path:
+                shutil.copyfile(entry, dest_path)
+                return dest_path
+            return entry
+        except FileNotFoundError:
+            return None
+
+    def put(self, key, src_path):
+        """Copy src_path into the cache under key and evict old entries if over budget."""
+        entry = self._entry_path(key)
+        os.makedirs(os.path.dirname(entry), exist_ok=True)
+
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(entry), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as tmp_file, open(src_path, 'rb') as src_file:
+                shutil.copyfileobj(src_file, tmp_file)
+            # sized before it is published, since a concurrent eviction may remove the entry right after
+            size = os.path.getsize(tmp_path)
+            os.replace(tmp_path, entry)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = sum(self._size(path) for path in self._entries())
+            else:
+                self._total_bytes += size
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+        return entry
+
+    @staticmethod
+    def _size(path):
+        try:
+            return os.path.getsize(path)
+        except FileNotFoundError:  # evicted by another process sharing the cache
+            return 0
+
+    def _evict(self):
+        entries = []
+        for path in self._entries():
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):  # least recently used first
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except FileNotFoundError:
+                pass
+        self._total_bytes = total
@@ -0,0 +1,47 @@
+"""
+Output formats rendered from one generation run.
+
+Each render profile is a frame size plus the encoding profile (video_encoder.ENCODING_PROFILES)
+used for it. A run lists the profiles it needs in constants.RENDER_PROFILES; images are
+requested once, in the 9:16 shape of the image model, at the smallest size that covers
+every profile, and each profile's frame is cropped and resized straight from that source.
+"""
+import math
+import constants
+
+
+PROFILES = {
+    # source resolution of the image model, the default deliverable
+    'standard': {'size': (720, 1280), 'encoding': constants.VIDEO_PROFILE},
+    # full HD YouTube Shorts upload
+    'shorts': {'size': (1080, 1920), 'encoding': 'shorts'},
+    # square cut for feeds
+    'square': {'size': (1080, 1080), 'encoding': 'standard'},
+    # small, quick to encode preview
+    'preview': {'size': (360, 640), 'encoding': 'draft'},
+}
+
+# aspect ratio the image model generates in
+SOURCE_ASPECT = (9, 16)
+
+
+def get_render_profile(name):
+    if name not in PROFILES:
+        raise ValueError(f"Unsupported render profile: {name}")
+    return PROFILES[name]
+
+
+def source_image_size(profile_names):
+    """
+    Smallest 9:16 image size (both sides multiples of 8) that covers every profile's frame.
+
+    :param profile_names: render profile names, e.g. ['shorts', 'square']
+    :return: (width, height) to request from the image model
+    """
+    aspect_w, aspect_h = SOURCE_ASPECT
+    scale = max(
+        max(width / aspect_w, height / aspect_h)
+        for width, height in (get_render_profile(name)['size'] for name in profile_names)
+    )
+    scale = math.ceil(scale / 8) * 8
+    return aspect_w * scale, aspect_h * scale
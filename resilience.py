@@ -0,0 +1,429 @@
+"""
+Timeouts, retries, hedged requests and circuit breaking for calls to remote services.
+
+Every call to the image Space, the chat model and the TTS service goes through the
+shared ResiliencePolicy of its service (see get_policy), configured in
+constants.REMOTE_CALL_POLICIES:
+
+- every request holds a slot of the service's concurrency budget (service_limits) while it
+  runs; the slot is taken before the request starts, so time spent queueing behind other
+  calls never counts as a timeout or as a failure of the service, and a call that gets no
+  slot within ``slot_timeout`` seconds fails fast like an open circuit;
+- each attempt runs on a worker thread and is abandoned after ``timeout`` seconds, so one
+  stuck request can't stall a run (the abandoned call finishes in the background and its
+  result is dropped; it gives its slot back right away, so hung requests can't use up the
+  budget);
+- transient failures (timeouts, rate limits, 5xx, dropped connections) are retried with
+  jittered exponential backoff;
+- an attempt still running after ``hedge_after`` seconds gets a duplicate request and the
+  first answer wins, which cuts the tail latency of slow calls;
+- after ``failure_threshold`` transient failures in a row the circuit opens and calls fail
+  fast (or go to their fallback) until a single probe call succeeds ``reset_seconds`` later.
+"""
+import asyncio
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import constants
+from service_limits import get_semaphore
+from instrumentation import bind, count
+
+
+# HTTP statuses worth retrying: timeouts, conflicts, rate limits and server errors
+RETRYABLE_STATUS_CODES = {408, 409, 425, 429, 500, 502, 503, 504, 529}
+RETRYABLE_ERROR_NAMES = {
+    'RateLimitError', 'APIConnectionError', 'APITimeoutError', 'InternalServerError', 'ServiceUnavailableError',
+    # httpx (gradio_client) and requests (gTTS) transport errors, which don't subclass the builtin ones
+    'ConnectError', 'ConnectTimeout', 'ReadTimeout', 'WriteTimeout', 'PoolTimeout', 'ReadError', 'RemoteProtocolError',
+    'ConnectionError', 'Timeout',
+}
+
+
+def _status_code(error):
+    response = getattr(error, 'response', None) or getattr(error, 'rsp', None)  # gTTSError keeps it in rsp
+    for candidate in (getattr(error, 'status_code', None), getattr(response, 'status_code', None)):
+        if isinstance(candidate, int):
+            return candidate
+    return None
+
+
+def is_retryable(error: Exception) -> bool:
+    """True for rate limits (429), server errors (5xx) and connection problems, whatever the provider SDK."""
+    status = _status_code(error)
+    if status is not None:
+        return status in RETRYABLE_STATUS_CODES
+    return isinstance(error, (TimeoutError, ConnectionError)) or type(error).__name__ in RETRYABLE_ERROR_NAMES
+
+
+def backoff_delay(error: Exception, attempt: int, base: float, cap: float = 30.0) -> float:
+    """Exponential backoff with jitter, or the server's Retry-After if that is longer."""
+    delay = min(cap, base * 2 ** attempt) * random.uniform(0.5, 1.0)
+    headers = getattr(getattr(error, 'response', None), 'headers', None) or {}
+    try:
+        return max(delay, float(headers.get('retry-after')))
+    except (TypeError, ValueError):
+        return delay
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling a service whose circuit is open."""
+
+
+class SlotTimeoutError(CircuitOpenError):
+    """Raised when no slot of the service's concurrency budget frees up in time; the service was not called."""
+
+
+class CircuitBreaker:
+    """
+    Counts consecutive transient failures of a service and stops calling it when they pile up.
+
+    closed: calls go through. open: calls are refused until reset_seconds have passed.
+    half open: one probe call goes through; its success closes the circuit, its failure
+    opens it again.
+    """
+
+    def __init__(self, name, failure_threshold=5, reset_seconds=30.0):
+        """
+        :param name: service name, used in messages and counters
+        :param failure_threshold: consecutive transient failures that open the circuit (0 disables the breaker)
+        :param reset_seconds: how long the circuit stays open before a probe call is let through
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = 'closed'
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """True if a call may go through now."""
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            if self.state == 'open' and time.monotonic() - self._opened_at >= self.reset_seconds:
+                self.state = 'half_open'
+                self._probing = False
+            if self.state == 'half_open' and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def release_probe(self):
+        """Hand back a probe that never reached the service, so the next call can probe instead."""
+        with self._lock:
+            self._probing = False
+
+    def record_success(self):
+        with self._lock:
+            if self.state != 'closed':
+                print(f"Circuit for {self.name} closed")
+            self.state = 'closed'
+            self._failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if self.state == 'half_open' or (self.failure_threshold and self._failures >= self.failure_threshold):
+                if self.state != 'open':
+                    print(f"Circuit for {self.name} opened after {self._failures} failure(s)")
+                    count(f'{self.name}.circuit_opened')
+                self.state = 'open'
+                self._opened_at = time.monotonic()
+
+
+class _Slot:
+    """A held slot of a service's concurrency budget; released once, when its request ends or is abandoned."""
+
+    def __init__(self, semaphore):
+        self._semaphore = semaphore
+        self._lock = threading.Lock()
+
+    def release(self, _=None):
+        with self._lock:
+            semaphore, self._semaphore = self._semaphore, None
+        if semaphore is not None:
+            semaphore.release()
+
+
+class ResiliencePolicy:
+    """Runs calls to one service with a timeout, retries, hedging and a circuit breaker, from threads or asyncio."""
+
+    def __init__(self, name, timeout=0.0, max_retries=0, backoff=1.0, hedge_after=0.0, breaker=None, semaphore=None,
+                 slot_timeout=None, max_workers=32):
+        """
+        :param name: service name ('image', 'llm', 'tts'), used in messages and counters
+        :param timeout: seconds an attempt may take before it is abandoned (0 waits forever)
+        :param max_retries: retries after a transient failure
+        :param backoff: base backoff delay in seconds
+        :param hedge_after: seconds after which a duplicate request is sent for a slow attempt (0 disables hedging)
+        :param breaker: CircuitBreaker shared by every call to the service, defaults to a disabled one
+        :param semaphore: concurrency budget of the service (see service_limits.get_semaphore); every request,
+            hedges included, holds a slot while it runs, and the timeout only starts once the slot is held
+        :param slot_timeout: seconds to wait for a slot before failing with SlotTimeoutError, defaults to
+            timeout (0 waits forever); abandoned requests give their slot back, so one frees up within timeout
+        :param max_workers: threads attempts run on; abandoned attempts keep a thread until they finish
+        """
+        self.name = name
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.hedge_after = hedge_after
+        self.breaker = breaker or CircuitBreaker(name, failure_threshold=0)
+        self.semaphore = semaphore
+        self.slot_timeout = timeout if slot_timeout is None else slot_timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f'{name}-call')
+
+    def _take_slot(self, wait=True):
+        """
+        Hold a slot of the service budget, or return None if none is free.
+
+        :param wait: wait up to slot_timeout seconds for one (False only takes a free slot)
+        """
+        if self.semaphore is None:
+            return _Slot(None)
+        if not wait:
+            acquired = self.semaphore.acquire(blocking=False)
+        else:
+            acquired = self.semaphore.acquire(timeout=self.slot_timeout or None)
+        return _Slot(self.semaphore) if acquired else None
+
+    def _no_slot(self):
+        count(f'{self.name}.slot_timeout')
+        return SlotTimeoutError(f"no {self.name} slot became free within {self.slot_timeout:g}s, not calling the service")
+
+    def _record(self, error, attempt, max_retries):
+        """Update the breaker after a failed attempt; returns True if the call should be retried."""
+        if isinstance(error, SlotTimeoutError):
+            # the service was never called, so the breaker learns nothing from it
+            self.breaker.release_probe()
+            return False
+        if not is_retryable(error):
+            # the service answered, so it is up; the request itself was bad
+            self.breaker.record_success()
+            return False
+        self.breaker.record_failure()
+        if attempt == max_retries:
+            return False
+        count(f'{self.name}.retry')
+        return True
+
+    def _give_up(self, error, fallback):
+        if fallback is None:
+            raise error
+        count(f'{self.name}.fallback')
+        print(f"{self.name} call failed ({type(error).__name__}: {error}), using the fallback")
+        return fallback(error)
+
+    def _short_circuit(self):
+        count(f'{self.name}.short_circuited')
+        return CircuitOpenError(f"{self.name} circuit is open, not calling the service")
+
+    def call(self, fn, *args, fallback=None, discard=None, **kwargs):
+        """
+        Call fn(*args, **kwargs) under the policy.
+
+        :param fallback: callable taking the last error, whose result is returned when the
+            circuit is open or every attempt failed; without it the last error is raised
+        :param discard: called with the result of every attempt that succeeded but lost
+            (a hedge that finished second, an attempt that timed out), e.g. to delete its file
+        """
+        error = None
+        for attempt in range(self.max_retries + 1):
+            if not self.breaker.allow():
+                error = self._short_circuit()
+                break
+            try:
+                result = self._attempt(fn, args, kwargs, discard)
+            except Exception as e:
+                error = e
+                if not self._record(e, attempt, self.max_retries):
+                    break
+                time.sleep(backoff_delay(e, attempt, self.backoff))
+            else:
+                self.breaker.record_success()
+                return result
+        return self._give_up(error, fallback)
+
+    def _submit(self, fn, args, kwargs, slots, wait=True):
+        """Start one request once it holds a service slot (kept in slots); None if no slot is free in time."""
+        slot = self._take_slot(wait)
+        if slot is None:
+            return None
+        try:
+            future = self._executor.submit(bind(fn), *args, **kwargs)
+        except Exception:
+            slot.release()
+            raise
+        # released when the request finishes, fails or is cancelled before it started, or when it is abandoned
+        future.add_done_callback(slot.release)
+        slots[future] = slot
+        return future
+
+    def _attempt(self, fn, args, kwargs, discard):
+        """One attempt: the first request, plus a hedged duplicate if it is slow; the first success wins."""
+        slots = {}
+        # waiting for a slot is not the service's fault, so the deadline starts once the request runs
+        first = self._submit(fn, args, kwargs, slots)
+        if first is None:
+            raise self._no_slot()
+        futures = [first]
+        started = time.monotonic()
+        hedged = not self.hedge_after
+        error = None
+        while futures:
+            elapsed = time.monotonic() - started
+            waits = []
+            if self.timeout:
+                waits.append(self.timeout - elapsed)
+            if not hedged:
+                waits.append(self.hedge_after - elapsed)
+            done, _ = wait(futures, timeout=max(min(waits), 0) if waits else None, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                futures.remove(future)
+                if future.exception() is None:
+                    self._abandon(futures, discard, slots)
+                    return future.result()
+                error = future.exception()
+            if not futures:
+                break
+
+            elapsed = time.monotonic() - started
+            if self.timeout and elapsed >= self.timeout:
+                self._abandon(futures, discard, slots)
+                count(f'{self.name}.timeout')
+                raise TimeoutError(f"{self.name} call timed out after {self.timeout:g}s")
+            if not hedged and elapsed >= self.hedge_after:
+                hedged = True
+                # a hedge only goes out if the service has a free slot, it never queues behind other calls
+                hedge = self._submit(fn, args, kwargs, slots, wait=False)
+                if hedge is not None:
+                    count(f'{self.name}.hedge')
+                    futures.append(hedge)
+        raise error
+
+    @staticmethod
+    def _abandon(futures, discard, slots):
+        for future in futures:
+            # an abandoned request may never return (gradio_client has no timeout), so it stops counting now
+            slots[future].release()
+            if future.cancel() or discard is None:
+                continue
+            future.add_done_callback(lambda f: f.exception() is None and discard(f.result()))
+
+    async def acall(self, fn, *args, fallback=None, max_retries=None, backoff=None):
+        """
+        Async counterpart of call() for coroutine functions, sharing the breaker and slots with it.
+
+        Hedges and timed-out requests are cancelled rather than abandoned.
+
+        :param fn: coroutine function, awaited as fn(*args)
+        :param fallback: async callable taking the last error, see call()
+        :param max_retries: retries after a transient failure, defaults to the policy's
+        :param backoff: base backoff delay in seconds, defaults to the policy's
+        """
+        max_retries = self.max_retries if max_retries is None else max_retries
+        backoff = self.backoff if backoff is None else backoff
+        error = None
+        for attempt in range(max_retries + 1):
+            if not self.breaker.allow():
+                error = self._short_circuit()
+                break
+            try:
+                result = await self._aattempt(fn, args)
+            except Exception as e:
+                error = e
+                if not self._record(e, attempt, max_retries):
+                    break
+                await asyncio.sleep(backoff_delay(e, attempt, backoff))
+            else:
+                self.breaker.record_success()
+                return result
+        return await self._give_up(error, fallback)
+
+    @staticmethod
+    def _astart(fn, args, slot, slots):
+        task = asyncio.ensure_future(fn(*args))
+        task.add_done_callback(slot.release)
+        slots.append(slot)
+        return task
+
+    async def _await_slot(self):
+        # the slots are threading semaphores shared with call(), so wait for one off the event loop
+        waiter = asyncio.ensure_future(asyncio.to_thread(self._take_slot))
+        try:
+            return await asyncio.shield(waiter)
+        except asyncio.CancelledError:
+            # the thread may still get a slot after this task is cancelled; hand it straight back
+            def give_back(f):
+                if not f.cancelled() and f.exception() is None and f.result() is not None:
+                    f.result().release()
+            waiter.add_done_callback(give_back)
+            raise
+
+    async def _aattempt(self, fn, args):
+        slot = await self._await_slot()
+        if slot is None:
+            raise self._no_slot()
+        slots = []
+        tasks = {self._astart(fn, args, slot, slots)}
+        started = time.monotonic()
+        hedged = not self.hedge_after
+        error = None
+        try:
+            while tasks:
+                elapsed = time.monotonic() - started
+                waits = []
+                if self.timeout:
+                    waits.append(self.timeout - elapsed)
+                if not hedged:
+                    waits.append(self.hedge_after - elapsed)
+                done, tasks = await asyncio.wait(tasks, timeout=max(min(waits), 0) if waits else None,
+                                                 return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+                if not tasks:
+                    break
+
+                elapsed = time.monotonic() - started
+                if self.timeout and elapsed >= self.timeout:
+                    count(f'{self.name}.timeout')
+                    raise TimeoutError(f"{self.name} call timed out after {self.timeout:g}s")
+                if not hedged and elapsed >= self.hedge_after:
+                    hedged = True
+                    hedge = self._take_slot(wait=False)
+                    if hedge is not None:
+                        count(f'{self.name}.hedge')
+                        tasks.add(self._astart(fn, args, hedge, slots))
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+            # a cancelled request may take a while to unwind, it stops counting now
+            for slot in slots:
+                slot.release()
+
+
+_policies = {}
+_policies_lock = threading.Lock()
+
+
+def get_policy(service):
+    """Return the process-wide ResiliencePolicy of a service ('llm', 'image' or 'tts'), built from constants on first use."""
+    with _policies_lock:
+        policy = _policies.get(service)
+        if policy is None:
+            settings = constants.REMOTE_CALL_POLICIES[service]
+            breaker = CircuitBreaker(service, settings['failure_threshold'], settings['reset_seconds'])
+            policy = ResiliencePolicy(service, settings['timeout'], settings['max_retries'], settings['backoff'],
+                                      settings['hedge_after'], breaker, semaphore=get_semaphore(service),
+                                      slot_timeout=settings['slot_timeout'])
+            _policies[service] = policy
+        return policy
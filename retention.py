@@ -0,0 +1,233 @@
+"""
+Retention of generated run directories in generated_media.
+
+Every finished run is recorded in a small SQLite index (size, creation and last access
+time), so cleanup never has to list and stat the whole media directory. A background
+sweeper then enforces a byte budget, a maximum age and a maximum number of runs,
+evicting the least recently used runs first.
+
+Runs that are still being generated hold a lease in the same index. Eviction and
+leasing both happen inside write transactions, so a run that is in use, in this process
+or any other worker sharing the directory, is never deleted. An evicted directory is
+first renamed out of the way inside the transaction and removed afterwards, so a new
+run can never write into a directory that is half deleted.
+"""
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import closing
+import constants
+
+
+INDEX_NAME = '.retention.sqlite3'
+TRASH_PREFIX = '.evicting_'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    name TEXT PRIMARY KEY,
+    bytes INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    last_access REAL NOT NULL,
+    lease_expires REAL NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS runs_last_access ON runs (last_access);
+"""
+
+
+def directory_bytes(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+class RetentionManager:
+
+    def __init__(self, media_dir, max_bytes=None, max_age=None, max_runs=None, lease_seconds=None):
+        """
+        :param media_dir: directory holding the generated_* run directories
+        :param max_bytes: total size of all runs, defaults to constants.RETENTION_MAX_BYTES (0 disables)
+        :param max_age: seconds since last access after which a run is evicted, defaults to constants.RETENTION_MAX_AGE_SECONDS (0 disables)
+        :param max_runs: number of runs kept, defaults to constants.RETENTION_MAX_RUNS (0 disables)
+        :param lease_seconds: how long a run stays protected after acquire(), defaults to constants.RETENTION_LEASE_SECONDS
+        """
+        self.media_dir = media_dir
+        self.max_bytes = constants.RETENTION_MAX_BYTES if max_bytes is None else max_bytes
+        self.max_age = constants.RETENTION_MAX_AGE_SECONDS if max_age is None else max_age
+        self.max_runs = constants.RETENTION_MAX_RUNS if max_runs is None else max_runs
+        self.lease_seconds = lease_seconds or constants.RETENTION_LEASE_SECONDS
+        self.db_path = os.path.join(media_dir, INDEX_NAME)
+        self._wakeup = threading.Event()
+        self._sweeper = None
+        self._sweeper_lock = threading.Lock()
+
+        os.makedirs(media_dir, exist_ok=True)
+        with closing(self._connect()) as connection:
+            connection.executescript(_SCHEMA)
+
+    def _connect(self):
+        connection = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        connection.row_factory = sqlite3.Row
+        connection.execute("PRAGMA journal_mode=WAL")
+        return connection
+
+    @staticmethod
+    def _is_safe(name):
+        """True if an index name is a directory inside media_dir (no '..' or absolute paths)."""
+        return bool(name) and not os.path.isabs(name) and '..' not in name.split(os.sep)
+
+    def _name(self, run_dir):
+        name = os.path.relpath(run_dir, self.media_dir)
+        if not self._is_safe(name):
+            raise ValueError(f"Run directory {run_dir} is not inside {self.media_dir}")
+        return name
+
+    def _upsert(self, run_dir, **fields):
+        now = time.time()
+        fields.setdefault('last_access', now)
+        assignments = ", ".join(f"{name} = excluded.{name}" for name in fields)
+        columns = ", ".join(fields)
+        placeholders = ", ".join("?" for _ in fields)
+        with closing(self._connect()) as connection:
+            connection.execute(
+                f"INSERT INTO runs (name, created_at, {columns}) VALUES (?, ?, {placeholders}) "
+                f"ON CONFLICT (name) DO UPDATE SET {assignments}",
+                (self._name(run_dir), now, *fields.values()),
+            )
+
+    def acquire(self, run_dir):
+        """Protect a run directory from eviction while it is being generated or resumed."""
+        self._upsert(run_dir, lease_expires=time.time() + self.lease_seconds)
+
+    def release(self, run_dir):
+        """Drop the lease of a run; it becomes eligible for eviction under the normal policies."""
+        self._upsert(run_dir, lease_expires=0)
+
+    def record(self, run_dir):
+        """Index a finished run with its current size and release its lease."""
+        self._upsert(run_dir, bytes=directory_bytes(run_dir), lease_expires=0)
+
+    def touch(self, run_dir):
+        """Mark a run as recently used (e.g. viewed or downloaded) so LRU eviction keeps it longer."""
+        with closing(self._connect()) as connection:
+            connection.execute("UPDATE runs SET last_access = ? WHERE name = ?", (time.time(), self._name(run_dir)))
+
+    def adopt_unindexed(self):
+        """Index run directories that predate the index or whose run crashed before being recorded."""
+        with closing(self._connect()) as connection:
+            known = {row['name'] for row in connection.execute("SELECT name FROM runs")}
+        adopted = 0
+        for entry in os.scandir(self.media_dir):
+            if entry.is_dir() and entry.name.startswith('generated_') and entry.name not in known:
+                mtime = entry.stat().st_mtime
+                with closing(self._connect()) as connection:
+                    connection.execute(
+                        "INSERT OR IGNORE INTO runs (name, bytes, created_at, last_access) VALUES (?, ?, ?, ?)",
+                        (entry.name, directory_bytes(entry.path), mtime, mtime),
+                    )
+                adopted += 1
+        return adopted
+
+    def _select_victims(self, rows, now, max_bytes, max_runs):
+        """Pick runs to evict from unleased rows ordered oldest access first."""
+        victims = []
+        total_bytes = sum(row['bytes'] for row in rows)
+        kept = len(rows)
+        for row in rows:
+            too_old = self.max_age and now - row['last_access'] > self.max_age
+            over_budget = max_bytes and total_bytes > max_bytes
+            too_many = max_runs and kept > max_runs
+            if not (too_old or over_budget or too_many):
+                continue
+            victims.append(row['name'])
+            total_bytes -= row['bytes']
+            kept -= 1
+        return victims
+
+    def enforce(self):
+        """Evict runs until every policy holds; returns the names of the evicted runs."""
+        now = time.time()
+        trash = []
+        connection = self._connect()
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            rows = connection.execute("SELECT * FROM runs ORDER BY last_access").fetchall()
+            leased = [row for row in rows if row['lease_expires'] > now]
+            candidates = [row for row in rows if row['lease_expires'] <= now]
+
+            # leased runs count towards the limits but are never evicted
+            max_bytes = max(self.max_bytes - sum(row['bytes'] for row in leased), 1) if self.max_bytes else 0
+            max_runs = max(self.max_runs - len(leased), 1) if self.max_runs else 0
+            victims = self._select_victims(candidates, now, max_bytes, max_runs)
+
+            for name in victims:
+                path = os.path.join(self.media_dir, name)
+                # rows written before names were checked are dropped without touching the filesystem
+                if self._is_safe(name) and os.path.isdir(path):
+                    trash_path = os.path.join(self.media_dir, f"{TRASH_PREFIX}{uuid.uuid4().hex}")
+                    os.rename(path, trash_path)
+                    trash.append(trash_path)
+                connection.execute("DELETE FROM runs WHERE name = ?", (name,))
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        finally:
+            connection.close()
+
+        for trash_path in trash:
+            shutil.rmtree(trash_path, ignore_errors=True)
+        for name in victims:
+            print(f"Evicted {name}")
+        return victims
+
+    def sweep(self):
+        """One full cleanup pass: finish interrupted deletions, index stray runs, enforce the policies."""
+        for entry in os.scandir(self.media_dir):
+            if entry.is_dir() and entry.name.startswith(TRASH_PREFIX):
+                shutil.rmtree(entry.path, ignore_errors=True)
+        self.adopt_unindexed()
+        return self.enforce()
+
+    def request_cleanup(self):
+        """Ask the background sweeper to run soon, starting it on first use."""
+        with self._sweeper_lock:
+            if self._sweeper is None or not self._sweeper.is_alive():
+                self._sweeper = threading.Thread(target=self._sweep_forever, name='retention-sweeper', daemon=True)
+                self._sweeper.start()
+        self._wakeup.set()
+
+    def _sweep_forever(self):
+        while True:
+            self._wakeup.wait(constants.RETENTION_SWEEP_SECONDS)
+            self._wakeup.clear()
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"Retention sweep failed: {e}")
+
+
+_managers = {}
+_managers_lock = threading.Lock()
+
+
+def get_retention_manager(media_dir):
+    """Shared RetentionManager for a media directory, so each process runs one sweeper per directory."""
+    key = os.path.abspath(media_dir)
+    with _managers_lock:
+        if key not in _managers:
+            _managers[key] = RetentionManager(media_dir)
+        return _managers[key]
+
+
+if __name__ == '__main__':
+    # One-off cleanup, e.g. from cron
+    evicted = RetentionManager('generated_media').sweep()
+    print(f"Evicted {len(evicted)} run(s)")
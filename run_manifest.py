@@ -0,0 +1,96 @@
+import glob
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+
+
+MANIFEST_NAME = 'manifest.json'
+# run IDs are uuid4().hex; anything else could point the run directory outside the media directory
+RUN_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as asset_file:
+        for chunk in iter(lambda: asset_file.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def validate_run_id(run_id):
+    """Return run_id if it is a valid run ID, raise ValueError otherwise."""
+    if not isinstance(run_id, str) or not RUN_ID_PATTERN.match(run_id):
+        raise ValueError(f"Invalid run ID {run_id!r}: expected 32 lowercase hex characters")
+    return run_id
+
+
+def find_run_dir(media_dir, run_id):
+    """Return the generated_<title>_<run_id> directory of a previous run, or None."""
+    matches = glob.glob(os.path.join(glob.escape(media_dir), f"generated_*_{glob.escape(run_id)}"))
+    return matches[0] if matches else None
+
+
+class RunManifest:
+    """
+    Checkpoint of one generation run, stored as manifest.json in its generated_video_dir.
+
+    It records the extracted TopN result and every completed asset with its SHA-256,
+    so a rerun with the same run ID can skip work that is already done and intact.
+    """
+
+    def __init__(self, run_dir, run_id, title=None):
+        self.run_dir = run_dir
+        self.path = os.path.join(run_dir, MANIFEST_NAME)
+        self._lock = threading.Lock()
+        self.data = {"run_id": run_id, "title": title, "result": None, "assets": {}, "created_at": time.time()}
+
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, encoding='utf-8') as manifest_file:
+                    self.data.update(json.load(manifest_file))
+            except (OSError, ValueError) as e:
+                print(f"Ignoring unreadable manifest {self.path}: {e}")
+
+    @property
+    def result(self):
+        return self.data.get("result")
+
+    def _relative(self, path):
+        return os.path.relpath(path, self.run_dir)
+
+    def save(self):
+        """Write the manifest atomically so a crash never leaves a half-written file."""
+        with self._lock:
+            os.makedirs(self.run_dir, exist_ok=True)
+            self.data["updated_at"] = time.time()
+            fd, tmp_path = tempfile.mkstemp(dir=self.run_dir, suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as tmp_file:
+                json.dump(self.data, tmp_file, indent=2)
+            os.replace(tmp_path, self.path)
+
+    def record_result(self, result):
+        """Store the extracted TopN (as a dict) so a resumed run skips the LLM call."""
+        self.data["result"] = result
+        self.save()
+
+    def record_asset(self, path):
+        """Mark a finished file as completed, keyed by its path relative to the run directory."""
+        sha256 = file_sha256(path)
+        with self._lock:
+            self.data["assets"][self._relative(path)] = {"sha256": sha256, "bytes": os.path.getsize(path)}
+        self.save()
+
+    def is_complete(self, path):
+        """True if the asset was recorded and the file on disk still has the recorded hash."""
+        with self._lock:
+            entry = self.data["assets"].get(self._relative(path))
+        if not entry or not os.path.exists(path):
+            return False
+        if file_sha256(path) != entry["sha256"]:
+            print(f"Checkpointed asset {path} is corrupt, regenerating.")
+            return False
+        return True
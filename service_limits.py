@@ -0,0 +1,22 @@
+import threading
+import constants
+
+
+_semaphores = {}
+_semaphores_lock = threading.Lock()
+
+
+def get_semaphore(service):
+    """
+    Return the process-wide semaphore that caps concurrent calls to an external service ('llm', 'image' or 'tts').
+
+    The budget is shared by every generator in the process, so many shorts rendered at
+    once (batch runs, concurrent Streamlit sessions) never exceed it in total; the
+    service's ResiliencePolicy takes a slot for every request.
+    """
+    with _semaphores_lock:
+        semaphore = _semaphores.get(service)
+        if semaphore is None:
+            semaphore = threading.BoundedSemaphore(constants.SERVICE_CONCURRENCY[service])
+            _semaphores[service] = semaphore
+        return semaphore
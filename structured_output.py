@@ -1,7 +1,12 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
 from typing import Type, Optional
 from pydantic import BaseModel, Field
-from langgraph.graph import StateGraph, START, END
 import constants
+from resilience import get_policy
+from instrumentation import count, span
 from typing import TypedDict
 
 
@@ -14,19 +19,29 @@ class State(TypedDict):
 
 # Generic Pydantic model-based structured output extractor
 class StructuredOutputExtractor:
-    def __init__(self, response_schema: Type[BaseModel]):
+    def __init__(self, response_schema: Type[BaseModel], provider: Optional[str] = None, model: Optional[str] = None, llm=None,
+                 fallback_llm=None, policy=None):
         """
         Initializes the extractor for any given structured output model.
         
         :param response_schema: Pydantic model class used for structured output extraction
+        :param provider: LLM provider name, defaults to constants.CHOSEN_LLM_PROVIDER
+        :param model: model name, defaults to the provider's entry in constants.selected_llm_model
+        :param llm: chat model to use instead of building one for the provider (e.g. fakes.FakeChatModel)
+        :param fallback_llm: chat model asked when the main one keeps failing or its circuit is open
+        :param policy: ResiliencePolicy for the model calls, defaults to the shared 'llm' policy
         """
         self.response_schema = response_schema
+        self.provider = provider or constants.CHOSEN_LLM_PROVIDER
+        self.model = model or constants.selected_llm_model.get(self.provider)
+        self.policy = policy or get_policy('llm')
 
-        # Initialize language model (provider and API keys come from constants.py)
-        self.llm = self._choose_llm_provider(constants.CHOSEN_LLM_PROVIDER)
+        # Initialize language model (API keys come from constants.py)
+        self.llm = llm or self._choose_llm_provider(self.provider, self.model)
         
         # Bind the model with structured output capability
         self.structured_llm = self.llm.with_structured_output(response_schema)
+        self.structured_fallback = fallback_llm.with_structured_output(response_schema) if fallback_llm is not None else None
         
         # Build the graph for structured output
         self._build_graph()
@@ -35,6 +50,9 @@ class StructuredOutputExtractor:
         """
         Build the LangGraph computational graph for structured extraction.
         """
+        # langgraph is slow to import, so it is loaded when the first extractor is built
+        from langgraph.graph import StateGraph, START, END
+
         graph_builder = StateGraph(State)
 
         # Add nodes and edges for structured output
@@ -54,12 +72,17 @@ class StructuredOutputExtractor:
         query = state['messages'][-1].content
         print(f"Processing query: {query}")
         try:
-            # Extract details using the structured model
-            output = self.structured_llm.invoke(query)
+            # Extract details using the structured model, with timeouts, retries and the circuit breaker of the 'llm' policy
+            fallback = None
+            if self.structured_fallback is not None:
+                def fallback(error):
+                    return self._invoke(self.structured_fallback, query)
+            output = self.policy.call(self._invoke, self.structured_llm, query, fallback=fallback)
             # Return the structured response
             return {"output": output}
         except Exception as e:
             print(f"Error during extraction: {e}")
+            count('llm.error')
             return {"output": None}
 
     def extract(self, query: str) -> Optional[BaseModel]:
@@ -71,32 +94,175 @@ class StructuredOutputExtractor:
         """
         from langchain_core.messages import HumanMessage
 
-        result = self.graph.invoke({
-            "messages": [HumanMessage(content=query)]
-        })
+        with span('llm', provider=self.provider, model=self.model):
+            result = self.graph.invoke({
+                "messages": [HumanMessage(content=query)]
+            })
         # Return the structured model response, if available
         result = result.get('output')
         return result
 
-    def _choose_llm_provider(self, chosen_llm_provider):
+    @staticmethod
+    def _invoke(structured_llm, query):
+        output = structured_llm.invoke(query)
+        if output is None:
+            raise ValueError("model returned no structured output")
+        return output
+
+    async def _ainvoke(self, structured_llm, query):
+        with span('llm', provider=self.provider, model=self.model):
+            output = await structured_llm.ainvoke(query)
+        if output is None:
+            raise ValueError("model returned no structured output")
+        return output
+
+    def extract_many(self, queries: list[str], max_concurrency: Optional[int] = None, max_retries: Optional[int] = None,
+                     backoff: Optional[float] = None) -> tuple[list[Optional[BaseModel]], dict[int, str]]:
+        """
+        Extract structured information for many queries concurrently.
+
+        Blocking wrapper around aextract_many for callers without an event loop.
+
+        :return: (results in query order with None for failures, {query index: error message})
+        """
+        return asyncio.run(self.aextract_many(queries, max_concurrency, max_retries, backoff))
+
+    async def aextract_many(self, queries: list[str], max_concurrency: Optional[int] = None, max_retries: Optional[int] = None,
+                            backoff: Optional[float] = None) -> tuple[list[Optional[BaseModel]], dict[int, str]]:
+        """
+        Run the queries through the chat model's async path with bounded concurrency.
+
+        Each query goes through the extractor's resilience policy (ResiliencePolicy.acall), so
+        a batch shares the provider's concurrency budget, timeout, hedging, circuit breaker
+        and fallback model with single extract() calls. Rate limits, 5xx and connection
+        errors are retried with exponential backoff; a query that still fails is reported
+        in the errors dict without affecting the others.
+
+        :param queries: input queries
+        :param max_concurrency: requests in flight at once, defaults to the 'llm' entry of constants.SERVICE_CONCURRENCY
+        :param max_retries: retries per query, defaults to the policy's (constants.LLM_MAX_RETRIES for the shared one)
+        :param backoff: base backoff delay in seconds, defaults to the policy's (constants.LLM_BACKOFF_SECONDS for the shared one)
+        :return: (results in query order with None for failures, {query index: error message})
+        """
+        max_concurrency = max_concurrency or constants.SERVICE_CONCURRENCY['llm']
+        semaphore = asyncio.Semaphore(max_concurrency)
+        print(f"Processing {len(queries)} queries, {max_concurrency} at a time")
+
+        with span('llm.batch', provider=self.provider, model=self.model, queries=len(queries)):
+            outcomes = await asyncio.gather(
+                *(self._aextract_with_policy(query, semaphore, max_retries, backoff) for query in queries),
+                return_exceptions=True,
+            )
+
+        results, errors = [], {}
+        for index, outcome in enumerate(outcomes):
+            if isinstance(outcome, BaseException):
+                count('llm.error')
+                errors[index] = f"{type(outcome).__name__}: {outcome}"
+                results.append(None)
+            else:
+                results.append(outcome)
+        return results, errors
+
+    async def _aextract_with_policy(self, query: str, semaphore: asyncio.Semaphore, max_retries: Optional[int],
+                                    backoff: Optional[float]) -> BaseModel:
+        fallback = None
+        if self.structured_fallback is not None:
+            def fallback(error):
+                return self._ainvoke(self.structured_fallback, query)
+        # the batch semaphore also bounds the threads waiting for the process-wide slots
+        async with semaphore:
+            return await self.policy.acall(self._ainvoke, self.structured_llm, query, fallback=fallback,
+                                           max_retries=max_retries, backoff=backoff)
+
+    @staticmethod
+    def _choose_llm_provider(chosen_llm_provider, model):
         """Dynamically imports and selects the LLM provider based on configuration, and asks to install the library if it's missing."""
         api_key = constants.llm_api_keys.get(chosen_llm_provider)
         if chosen_llm_provider == 'openai':
             from langchain_openai import ChatOpenAI
-            return ChatOpenAI(model=constants.selected_llm_model.get('openai'), streaming=True, api_key=api_key)
+            return ChatOpenAI(model=model, streaming=True, api_key=api_key)
         elif chosen_llm_provider == 'ollama':
             from langchain_ollama import ChatOllama
-            return ChatOllama(model=constants.selected_llm_model.get('ollama'))  # streaming is enabled by default
+            return ChatOllama(model=model)  # streaming is enabled by default
         elif chosen_llm_provider == 'groq':
             from langchain_groq import ChatGroq
-            return ChatGroq(model=constants.selected_llm_model.get('groq'), streaming=True, api_key=api_key)
+            return ChatGroq(model=model, streaming=True, api_key=api_key)
         elif chosen_llm_provider == 'anthropic':
             from langchain_anthropic import ChatAnthropic
-            return ChatAnthropic(model=constants.selected_llm_model.get('anthropic'), streaming=True, api_key=api_key)
+            return ChatAnthropic(model=model, streaming=True, api_key=api_key)
         else:
             raise ValueError(f"Unsupported LLM provider: {chosen_llm_provider}")
 
 
+_extractors = {}
+_extractors_lock = threading.Lock()
+
+
+def _fallback_llm(provider: str):
+    """Chat model of constants.LLM_FALLBACK_PROVIDER, or None if it is unset or the main provider itself."""
+    fallback = constants.LLM_FALLBACK_PROVIDER
+    if not fallback or fallback == provider:
+        return None
+    return StructuredOutputExtractor._choose_llm_provider(fallback, constants.selected_llm_model.get(fallback))
+
+
+def get_extractor(response_schema: Type[BaseModel], provider: Optional[str] = None, model: Optional[str] = None) -> StructuredOutputExtractor:
+    """
+    Return a shared extractor for (schema, provider, model), building it on first use.
+
+    Building an extractor imports the provider module, constructs the chat model and
+    compiles the graph, so it is done once per process rather than once per request.
+    """
+    provider = provider or constants.CHOSEN_LLM_PROVIDER
+    model = model or constants.selected_llm_model.get(provider)
+    key = (response_schema, provider, model)
+    with _extractors_lock:
+        extractor = _extractors.get(key)
+        if extractor is None:
+            extractor = StructuredOutputExtractor(response_schema, provider=provider, model=model,
+                                                  fallback_llm=_fallback_llm(provider))
+            _extractors[key] = extractor
+        return extractor
+
+
+class ResultCache:
+    """Thread-safe in-memory cache with a time-to-live and least-recently-used eviction."""
+
+    def __init__(self, max_entries: int = 256, ttl: float = 3600):
+        """
+        :param max_entries: number of entries kept before the least recently used is evicted
+        :param ttl: seconds an entry stays valid after it was stored
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, value = entry
+            if time.monotonic() - stored_at > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
 if __name__ == '__main__':
         
         # Example Pydantic model (e.g., Movie)
@@ -0,0 +1,127 @@
+import os
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import constants
+from media_cache import MediaCache
+from resilience import get_policy
+from instrumentation import bind, count, count_file_bytes, span
+
+
+class GTTSBackend:
+    """Google Translate text-to-speech through gTTS (one HTTP request per clip)."""
+    name = 'gtts'
+
+    def __init__(self, lang='en', tld='com'):
+        """
+        :param lang: language of the spoken text
+        :param tld: Google Translate domain, which selects the accent/voice
+        """
+        self.lang = lang
+        self.voice = tld
+
+    def synthesize(self, text, path):
+        from gtts import gTTS
+
+        gTTS(text=text, lang=self.lang, tld=self.voice).save(path)
+
+
+_tts_cache = None
+
+
+def get_tts_cache():
+    """Return the process-wide TTS clip cache, or None when caching is disabled."""
+    global _tts_cache
+    if _tts_cache is None and constants.TTS_CACHE_MAX_BYTES > 0:
+        _tts_cache = MediaCache(constants.TTS_CACHE_DIR, constants.TTS_CACHE_MAX_BYTES, extension='.mp3')
+    return _tts_cache
+
+
+class TextToSpeech:
+    """
+    Synthesizes speech clips through a pluggable backend, with a persistent cache.
+
+    A backend is any object with ``name``, ``lang`` and ``voice`` attributes and a
+    ``synthesize(text, path)`` method, so gTTS can be swapped for an offline engine
+    or a stub (see ``fakes.FakeTTSBackend``).
+    """
+
+    def __init__(self, backend=None, cache=None, max_workers=None, policy=None, fallback_backend=None):
+        """
+        :param backend: TTS backend, defaults to GTTSBackend
+        :param cache: MediaCache for synthesized clips, defaults to the shared cache (None if disabled in constants)
+        :param max_workers: maximum number of clips synthesized at once
+        :param policy: ResiliencePolicy for the backend calls, defaults to the shared 'tts' policy
+        :param fallback_backend: backend used when the main one keeps failing or its circuit is open; its clips are not cached
+        """
+        self.backend = backend or GTTSBackend()
+        self.cache = cache if cache is not None else get_tts_cache()
+        self.max_workers = max_workers or constants.TTS_MAX_WORKERS
+        self.policy = policy or get_policy('tts')
+        self.fallback_backend = fallback_backend
+
+    def synthesize(self, text, path):
+        with span('tts', path=path, backend=self.backend.name):
+            return self._synthesize(text, path)
+
+    def _synthesize(self, text, path):
+        cache_key = None
+        if self.cache is not None:
+            cache_key = MediaCache.make_key(self.backend.name, text, self.backend.lang, self.backend.voice)
+            if self.cache.get(cache_key, dest_path=path):
+                count('tts.cache_hit')
+                count_file_bytes('bytes.audio', path)
+                print(f"Audio cache hit for: {text[:50]}")
+                return path
+
+        # attempts write to their own temp files, so a hedged or abandoned attempt never clobbers the clip
+        def fallback(error):
+            return self._synthesize_to_temp(self.fallback_backend, text, path)
+
+        tmp_path, backend = self.policy.call(self._synthesize_to_temp, self.backend, text, path,
+                                             fallback=fallback if self.fallback_backend is not None else None,
+                                             discard=self._discard_attempt)
+        shutil.move(tmp_path, path)
+        count('tts.synthesized')
+        count_file_bytes('bytes.audio', path)
+
+        if cache_key and backend is self.backend:
+            self.cache.put(cache_key, path)
+        return path
+
+    @staticmethod
+    def _synthesize_to_temp(backend, text, path):
+        fd, tmp_path = tempfile.mkstemp(suffix=os.path.splitext(path)[1])
+        os.close(fd)
+        try:
+            backend.synthesize(text, tmp_path)
+        except Exception:
+            os.remove(tmp_path)
+            raise
+        return tmp_path, backend
+
+    @staticmethod
+    def _discard_attempt(result):
+        tmp_path, _ = result
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    def synthesize_many(self, jobs):
+        """
+        Synthesize several clips concurrently.
+
+        :param jobs: list of (text, path) tuples
+        :return: dict mapping each failed path to its error message
+        """
+        errors = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {executor.submit(bind(self.synthesize), text, path): path for text, path in jobs}
+            for future in as_completed(futures):
+                path = futures[future]
+                try:
+                    future.result()
+                    print(f"Audio clip {path} saved.")
+                except Exception as e:
+                    errors[path] = str(e)
+                    print(f"Audio clip {path} failed: {e}")
+        return errors
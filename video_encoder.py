@@ -0,0 +1,264 @@
+import os
+import shutil
+import subprocess
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+import constants
+
+
+@lru_cache(maxsize=None)
+def get_ffmpeg_exe():
+    """Path of the ffmpeg binary MoviePy uses (bundled with imageio-ffmpeg unless overridden), looked up once."""
+    import imageio_ffmpeg
+
+    return os.getenv('FFMPEG_BINARY') or imageio_ffmpeg.get_ffmpeg_exe()
+
+
+def run_ffmpeg(args, input_bytes=None):
+    command = [get_ffmpeg_exe(), '-hide_banner', '-loglevel', 'error', '-y'] + args
+    completed = subprocess.run(command, input=input_bytes, capture_output=True)
+    if completed.returncode != 0:
+        stderr = completed.stderr.decode('utf-8', errors='replace').strip()
+        raise RuntimeError(f"ffmpeg failed ({completed.returncode}): {stderr}")
+
+
+def to_rgb_array(image):
+    """Return an in-memory frame (PIL image or numpy array) as a contiguous HxWx3 uint8 array."""
+    import numpy as np
+
+    if hasattr(image, 'convert'):
+        image = image.convert('RGB')
+    return np.ascontiguousarray(np.asarray(image, dtype=np.uint8)[:, :, :3])
+
+
+# Encoding profiles; every profile uses software x264 + AAC so it behaves the same on any machine.
+#   draft       fast previews, low quality
+#   standard    default, still-image tuned x264 at VIDEO_FPS
+#   production  slower preset, high quality constant rate factor
+#   shorts      fixed bitrate suited to YouTube Shorts uploads
+#   stills      low frame rate, for still-image content where motion never happens
+ENCODING_PROFILES = {
+    'draft': {
+        'fps': 12, 'video_args': ['-preset', 'ultrafast', '-crf', '32'],
+        'audio_bitrate': '96k', 'audio_rate': 44100,
+    },
+    'standard': {
+        'fps': constants.VIDEO_FPS, 'video_args': ['-tune', 'stillimage', '-preset', 'veryfast'],
+        'audio_bitrate': '128k', 'audio_rate': 44100,
+    },
+    'production': {
+        'fps': 30, 'video_args': ['-tune', 'stillimage', '-preset', 'slow', '-crf', '18'],
+        'audio_bitrate': '192k', 'audio_rate': 48000,
+    },
+    'shorts': {
+        'fps': 30, 'video_args': ['-preset', 'medium', '-b:v', '8M', '-maxrate', '8M', '-bufsize', '16M'],
+        'audio_bitrate': '192k', 'audio_rate': 48000,
+    },
+    'stills': {
+        'fps': 5, 'video_args': ['-tune', 'stillimage', '-preset', 'veryfast'],
+        'audio_bitrate': '128k', 'audio_rate': 44100,
+    },
+}
+
+
+def get_profile(profile):
+    """Look up an encoding profile by name (a dict is returned unchanged)."""
+    if isinstance(profile, dict):
+        return profile
+    if profile not in ENCODING_PROFILES:
+        raise ValueError(f"Unsupported encoding profile: {profile}")
+    return ENCODING_PROFILES[profile]
+
+
+def encode_still_segment(image, audio_path, output_path, profile=constants.VIDEO_PROFILE, threads=0, frame_count=None):
+    """
+    Encode one still image for the length of its audio clip, or for an exact number of frames.
+
+    A file is read at 1 fps and frames are duplicated up to the profile's fps by the fps
+    filter, so the PNG is not decoded again for every output frame. An in-memory frame is
+    piped to ffmpeg once as raw RGB and repeated by the loop filter, so it is never encoded
+    to PNG at all. No per-frame compositing happens in Python.
+
+    :param image: image file path, PIL image or HxWx3 numpy array
+    :param audio_path: audio clip that sets the length, or None for a video-only segment
+    :param profile: name of an ENCODING_PROFILES entry, or a profile dict
+    :param threads: x264 threads for this segment, 0 lets ffmpeg decide
+    :param frame_count: number of frames to encode, required when audio_path is None
+    """
+    profile = get_profile(profile)
+    fps = profile['fps']
+    input_bytes = None
+    if isinstance(image, (str, os.PathLike)):
+        video_input = ['-loop', '1', '-framerate', '1', '-i', image]
+        video_filter = f'fps={fps}'
+    else:
+        frame = to_rgb_array(image)
+        height, width = frame.shape[:2]
+        video_input = ['-f', 'rawvideo', '-pix_fmt', 'rgb24', '-s', f'{width}x{height}', '-framerate', str(fps), '-i', 'pipe:0']
+        video_filter = 'loop=loop=-1:size=1'
+        input_bytes = frame.tobytes()
+
+    if audio_path is None:
+        audio_args = ['-map', '0:v', '-an', '-frames:v', str(frame_count)]
+    else:
+        audio_args = [
+            '-i', audio_path,
+            '-map', '0:v', '-map', '1:a',
+            '-c:a', 'aac', '-b:a', profile['audio_bitrate'], '-ar', str(profile['audio_rate']), '-ac', '2',
+            '-shortest',
+        ]
+        if frame_count is not None:
+            audio_args += ['-frames:v', str(frame_count)]
+
+    run_ffmpeg(video_input + audio_args + [
+        '-vf', f'{video_filter},scale=trunc(iw/2)*2:trunc(ih/2)*2,format=yuv420p',
+        '-c:v', 'libx264', *profile['video_args'], '-threads', str(threads),
+        output_path,
+    ], input_bytes=input_bytes)
+    return output_path
+
+
+def frame_counts(durations, fps):
+    """
+    Whole frames per segment, cut at the frame nearest to each segment's exact start.
+
+    Rounding the cumulative boundaries instead of every duration on its own keeps the error
+    under half a frame at every boundary, however many segments there are.
+    """
+    counts = []
+    elapsed = 0.0
+    for duration in durations:
+        start = round(elapsed * fps)
+        elapsed += duration
+        counts.append(max(1, round(elapsed * fps) - start))
+    return counts
+
+
+def concat_segments(segment_paths, output_path, audio_track=None, profile=constants.VIDEO_PROFILE):
+    """
+    Join encoded segments with the concat demuxer, copying streams instead of re-encoding.
+
+    With audio_track, the segments are video only and the track is encoded once, in the
+    same pass, as the audio of the whole video.
+
+    The index (moov atom) is written at the start of the file, so players and range
+    requests can start playback before the whole video has been downloaded.
+    """
+    fd, list_path = tempfile.mkstemp(suffix='.txt')
+    try:
+        with os.fdopen(fd, 'w') as list_file:
+            for segment_path in segment_paths:
+                escaped = os.path.abspath(segment_path).replace("'", "'\\''")
+                list_file.write(f"file '{escaped}'\n")
+        args = ['-f', 'concat', '-safe', '0', '-i', list_path]
+        if audio_track is None:
+            args += ['-c', 'copy']
+        else:
+            profile = get_profile(profile)
+            args += [
+                '-i', audio_track,
+                '-map', '0:v', '-map', '1:a', '-c:v', 'copy',
+                '-c:a', 'aac', '-b:a', profile['audio_bitrate'], '-ar', str(profile['audio_rate']), '-ac', '2',
+                '-shortest',
+            ]
+        run_ffmpeg(args + ['-movflags', '+faststart', output_path])
+    finally:
+        os.remove(list_path)
+    return output_path
+
+
+def make_ffmpeg_slideshow(segments, output_path, profile=constants.VIDEO_PROFILE, workers=None, audio_track=None):
+    """
+    Assemble a slideshow of still images, each shown for the length of its audio clip.
+
+    Segments are independent, so they are encoded in parallel (one ffmpeg process each,
+    sharing the available cores) and then joined with a stream-copy concat.
+
+    With audio_track, segments carry their exact durations instead of clips: each still is
+    cut to whole frames at the nearest boundary and the single track is muxed in at the end,
+    so audio and pictures cannot drift apart from one segment to the next.
+
+    :param segments: list of (image, audio_path) tuples in playback order, where image is a
+        file path, PIL image or numpy array; (image, seconds) tuples when audio_track is given
+    :param output_path: path of the final mp4
+    :param profile: name of an ENCODING_PROFILES entry, or a profile dict
+    :param workers: segments encoded at once, defaults to constants.VIDEO_ENCODE_WORKERS
+    :param audio_track: audio file covering every segment (see audio_assembly.assemble_audio)
+    """
+    workers = max(1, min(workers or constants.VIDEO_ENCODE_WORKERS, len(segments)))
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    if audio_track is None:
+        jobs = [(image, audio_path, None) for image, audio_path in segments]
+    else:
+        counts = frame_counts([duration for _, duration in segments], get_profile(profile)['fps'])
+        jobs = [(image, None, count) for (image, _), count in zip(segments, counts)]
+    work_dir = tempfile.mkdtemp(prefix='segments_', dir=os.path.dirname(os.path.abspath(output_path)))
+    try:
+        segment_paths = [os.path.join(work_dir, f"{index}.mp4") for index in range(len(segments))]
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(encode_still_segment, image, audio_path, segment_path, profile, threads, count)
+                for (image, audio_path, count), segment_path in zip(jobs, segment_paths)
+            ]
+            for future in futures:
+                future.result()
+        return concat_segments(segment_paths, output_path, audio_track=audio_track, profile=profile)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def make_moviepy_video(segments, output_path, profile=constants.VIDEO_PROFILE, workers=None, audio_track=None):
+    """
+    Assemble the same slideshow by compositing every frame with MoviePy.
+
+    :param segments: list of (image, audio_path) tuples in playback order, where image is a
+        file path, PIL image or numpy array; (image, seconds) tuples when audio_track is given
+    :param output_path: path of the final mp4
+    :param profile: name of an ENCODING_PROFILES entry, or a profile dict
+    :param workers: x264 threads
+    :param audio_track: audio file covering every segment (see audio_assembly.assemble_audio)
+    """
+    from moviepy.editor import ImageClip, concatenate_videoclips, AudioFileClip
+
+    profile = get_profile(profile)
+
+    def image_clip(image):
+        return ImageClip(image if isinstance(image, (str, os.PathLike)) else to_rgb_array(image))
+
+    if audio_track is None:
+        # Initialize audio clips
+        audio_clips = [AudioFileClip(audio_path) for _, audio_path in segments]
+
+        # Initialize image clips with matching durations and attach the audio
+        image_clips_with_audio = [image_clip(image).set_duration(audio.duration).set_audio(audio)
+                                  for (image, _), audio in zip(segments, audio_clips)]
+
+        # Concatenate all video clips
+        video_clip = concatenate_videoclips(image_clips_with_audio, method="compose")
+    else:
+        # One audio reader for the whole narration, stills cut to the exact segment durations
+        image_clips = [image_clip(image).set_duration(duration) for image, duration in segments]
+        video_clip = concatenate_videoclips(image_clips, method="compose").set_audio(AudioFileClip(audio_track))
+
+    # Save the final video
+    video_clip.write_videofile(output_path, codec='libx264', fps=profile['fps'], ffmpeg_params=[*profile['video_args'], '-movflags', '+faststart'],
+                               audio_bitrate=profile['audio_bitrate'], audio_fps=profile['audio_rate'], threads=workers)
+    return output_path
+
+
+VIDEO_ENGINES = {
+    'ffmpeg': make_ffmpeg_slideshow,
+    'moviepy': make_moviepy_video,
+}
+
+
+def make_slideshow(segments, output_path, engine=constants.VIDEO_ENGINE, profile=constants.VIDEO_PROFILE, workers=None, audio_track=None):
+    """
+    Assemble a still-image slideshow with the chosen engine ('ffmpeg' or 'moviepy') and encoding profile.
+
+    Segments are (image, audio_path) pairs, or (image, seconds) pairs with one audio_track for the whole video.
+    """
+    if engine not in VIDEO_ENGINES:
+        raise ValueError(f"Unsupported video engine: {engine}")
+    return VIDEO_ENGINES[engine](segments, output_path, profile=profile, workers=workers, audio_track=audio_track)
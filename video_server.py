@@ -0,0 +1,160 @@
+"""
+Streaming of finished videos from generated_media without loading them into memory.
+
+Streamlit's download button and st.video(path) load the whole file into server memory for
+every viewer. By default the app instead links the video into Streamlit's static folder
+(static_video_url, needs server.enableStaticServing), where Tornado sends it from disk and
+honours Range requests, so a browser preview can seek and start playing at once (the
+encoder writes the moov atom first) and memory stays flat however many downloads run.
+
+The small HTTP server below does the same on its own port. The app only uses it when
+constants.VIDEO_SERVER_URL says where browsers can reach it; the port is not reachable on
+hosts that expose just the Streamlit port.
+"""
+import hashlib
+import os
+import re
+import threading
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import quote, unquote, urlsplit
+import constants
+
+
+CHUNK_SIZE = 256 * 1024
+# Streamlit serves the files in static/ next to app.py under app/static/, and refuses files above 200 MB
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+STATIC_MAX_BYTES = 200 * 1024 * 1024
+_RANGE = re.compile(r"bytes=(\d*)-(\d*)$")
+
+
+class VideoRequestHandler(BaseHTTPRequestHandler):
+    """Serve .mp4 files below the server root with single-range support."""
+
+    def _resolve(self):
+        url = urlsplit(self.path)
+        relative = unquote(url.path).lstrip('/')
+        root = os.path.realpath(self.server.root_dir)
+        path = os.path.realpath(os.path.join(root, relative))
+        if os.path.commonpath([root, path]) != root or not path.endswith('.mp4') or not os.path.isfile(path):
+            return None, url
+        return path, url
+
+    def do_HEAD(self):
+        self._send_video(head_only=True)
+
+    def do_GET(self):
+        self._send_video(head_only=False)
+
+    def _send_video(self, head_only):
+        path, url = self._resolve()
+        if path is None:
+            self.send_error(HTTPStatus.NOT_FOUND)
+            return
+
+        size = os.path.getsize(path)
+        start, end = 0, size - 1
+        status = HTTPStatus.OK
+        match = _RANGE.match(self.headers.get('Range', '').strip())
+        if match and any(match.groups()):
+            first, last = match.groups()
+            if first:
+                start = int(first)
+                end = min(int(last), size - 1) if last else size - 1
+            else:  # suffix range: the last N bytes
+                start = max(size - int(last), 0)
+            if start > end or start >= size:
+                self.send_response(HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+                self.send_header('Content-Range', f"bytes */{size}")
+                self.end_headers()
+                return
+            status = HTTPStatus.PARTIAL_CONTENT
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'video/mp4')
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('Content-Length', str(end - start + 1))
+        if status == HTTPStatus.PARTIAL_CONTENT:
+            self.send_header('Content-Range', f"bytes {start}-{end}/{size}")
+        if 'download' in url.query:
+            self.send_header('Content-Disposition', 'attachment; filename="youtube_short.mp4"')
+        self.end_headers()
+        if head_only:
+            return
+
+        with open(path, 'rb') as video_file:
+            video_file.seek(start)
+            remaining = end - start + 1
+            try:
+                while remaining > 0:
+                    chunk = video_file.read(min(CHUNK_SIZE, remaining))
+                    if not chunk:
+                        break
+                    self.wfile.write(chunk)
+                    remaining -= len(chunk)
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # the player closed the connection, e.g. after seeking
+
+    def log_message(self, format, *args):
+        pass
+
+
+class VideoServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, root_dir, host, port):
+        self.root_dir = root_dir
+        super().__init__((host, port), VideoRequestHandler)
+
+
+def start_video_server(root_dir='generated_media', host=None, port=None):
+    """Serve root_dir on a background thread and return the server."""
+    os.makedirs(root_dir, exist_ok=True)
+    server = VideoServer(root_dir, host or constants.VIDEO_SERVER_HOST,
+                         constants.VIDEO_SERVER_PORT if port is None else port)
+    threading.Thread(target=server.serve_forever, name='video-server', daemon=True).start()
+    return server
+
+
+def video_url(video_path, root_dir='generated_media', base_url=None, download=False):
+    """URL under which the video server exposes video_path."""
+    relative = os.path.relpath(video_path, root_dir).replace(os.sep, '/')
+    base_url = base_url or constants.VIDEO_SERVER_URL or f"http://{constants.VIDEO_SERVER_HOST}:{constants.VIDEO_SERVER_PORT}"
+    url = f"{base_url.rstrip('/')}/{quote(relative)}"
+    return url + "?download=1" if download else url
+
+
+def static_video_url(video_path, static_dir=STATIC_DIR):
+    """
+    Link video_path into Streamlit's static folder and return its URL, or None if it can't be served there.
+
+    The file is hard-linked (Tornado refuses symlinks leading out of static/), so nothing is
+    copied; a link whose run was evicted by retention is the file's last name and is removed
+    on the way, so the run stops being served and its disk space is freed.
+    """
+    if os.path.getsize(video_path) > STATIC_MAX_BYTES:
+        return None
+    link_dir = os.path.join(static_dir, 'videos')
+    target = os.path.abspath(video_path)
+    name = f"{hashlib.sha1(target.encode('utf-8')).hexdigest()[:16]}.mp4"
+    link = os.path.join(link_dir, name)
+    try:
+        os.makedirs(link_dir, exist_ok=True)
+        for entry in os.scandir(link_dir):
+            if entry.is_file() and entry.stat().st_nlink == 1:
+                os.remove(entry.path)
+        if not os.path.exists(link):
+            os.link(target, link)
+    except FileExistsError:
+        pass  # linked by another session at the same time
+    except OSError as e:
+        print(f"Could not link {video_path} into {link_dir}: {e}")
+        return None
+    return f"app/static/videos/{name}"
+
+
+if __name__ == '__main__':
+    # Run the server on its own, e.g. behind a reverse proxy that also fronts the app
+    server = VideoServer('generated_media', constants.VIDEO_SERVER_HOST, constants.VIDEO_SERVER_PORT)
+    print(f"Serving generated_media on {constants.VIDEO_SERVER_HOST}:{constants.VIDEO_SERVER_PORT}")
+    server.serve_forever()
@@ -1,181 +1,546 @@
 import os
 import uuid
 import shutil
-from image_generator import ImageGenerator
-from moviepy.editor import ImageClip, concatenate_videoclips,AudioFileClip
-from function_wrap_center import add_text_to_image
-from gtts import gTTS
-from structured_output import StructuredOutputExtractor
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import constants
+from image_generator import ImageGenerator, get_client_pool
+from video_encoder import get_ffmpeg_exe, make_slideshow
+from audio_assembly import assemble_audio
+from render_profiles import get_render_profile, source_image_size
+from instrumentation import Tracer, bind, count, count_file_bytes, span, stage
+from run_manifest import RunManifest, find_run_dir, validate_run_id
+from retention import get_retention_manager
+from PIL import Image
+from function_wrap_center import get_overlay_executor, overlay_frames, preload_fonts
+from text_to_speech import TextToSpeech
+from structured_output import get_extractor, ResultCache
 from pydantic import BaseModel, Field
 
 
+# Define your data extraction model here
+class TopN(BaseModel):
+    title: str = Field(description="the title of the youtube video")
+    title_image_prompt: str = Field(description="highly detailed and descriptive image prompt for the background image of Title")
+    items: list[str] = Field(description="top n number of requested items")
+    items_image_prompts: list[str] = Field(description="highly detailed and descriptive image prompts for each item ")
+
+
+# LLM results for recently requested titles, shared by all generators in the process
+_title_results = ResultCache(max_entries=constants.TITLE_CACHE_MAX_ENTRIES, ttl=constants.TITLE_CACHE_TTL_SECONDS)
+
+
+def normalize_title(title):
+    """Collapse case and whitespace so equivalent titles share a cache entry."""
+    return " ".join(title.lower().split())
+
+
+def _title_cache_key(title):
+    return normalize_title(title), constants.CHOSEN_LLM_PROVIDER, constants.selected_llm_model.get(constants.CHOSEN_LLM_PROVIDER)
+
+
+def prefetch_title_results(titles, extractor=None):
+    """
+    Extract the TopN results of many titles in one concurrent batch and put them in the title cache.
+
+    Generators started afterwards for these titles skip their LLM call. Titles that are
+    already cached are not requested again.
+
+    :return: {title: error message} for titles that could not be extracted
+    """
+    # one request per distinct normalized title
+    pending = list({_title_cache_key(title): title for title in reversed(titles)
+                    if _title_results.get(_title_cache_key(title)) is None}.values())[::-1]
+    if not pending:
+        return {}
+    extractor = extractor or get_extractor(TopN)
+    results, errors = extractor.extract_many(pending)
+    for title, result in zip(pending, results):
+        if result is not None:
+            _title_results.set(_title_cache_key(title), result)
+    return {pending[index]: error for index, error in errors.items()}
+
+
+def warmup(render_profiles=None):
+    """
+    Pay the one-off startup costs of a process before its first generation.
+
+    Heavy dependencies (langgraph, the LLM provider SDK, gradio_client, gTTS) are only
+    imported when first needed; this builds the shared extractor and its compiled graph,
+    connects the shared Space client pool, imports gTTS, loads the overlay fonts for the
+    render profiles and locates ffmpeg. A step that fails (e.g. no network) is reported
+    and simply happens again on the first real run.
+
+    :param render_profiles: render profile names whose fonts are loaded, defaults to constants.RENDER_PROFILES
+    :return: {step: seconds}
+    """
+    import importlib
+
+    render_profiles = render_profiles or constants.RENDER_PROFILES
+    steps = {
+        "llm": lambda: get_extractor(TopN),
+        "image_client": lambda: get_client_pool().get_client(),
+        "tts": lambda: importlib.import_module('gtts'),
+        "fonts": lambda: preload_fonts([get_render_profile(name)['size'] for name in render_profiles]),
+        "ffmpeg": get_ffmpeg_exe,
+    }
+    timings = {}
+    for name, step in steps.items():
+        started = time.perf_counter()
+        try:
+            step()
+        except Exception as e:
+            print(f"Warmup step {name} failed: {e}")
+        timings[name] = round(time.perf_counter() - started, 3)
+    print("Warmup (s):", timings)
+    return timings
+
+
 class YoutubeShortGenerator:
 
-    def __init__(self):
+    def __init__(self, tts=None, image_generator=None, persist_frames=False, tracer=None, run_id=None, retention=None,
+                 render_profiles=None, extractor=None, media_dir='generated_media'):
+        """
+        :param tts: TextToSpeech used for the audio clips, defaults to gTTS with the shared clip cache
+        :param image_generator: ImageGenerator used for the images, defaults to the shared Space client pool and cache
+        :param persist_frames: also write the overlaid frames to overlay_dir; by default they stay in memory
+        :param tracer: instrumentation.Tracer receiving stage/item spans and counters, one is created if omitted
+        :param run_id: ID of an earlier run to resume; its checkpointed result and intact assets are reused
+            (a uuid4().hex as generated by the run, ValueError otherwise)
+        :param retention: retention.RetentionManager that protects this run and cleans up old ones, defaults to the shared one for media_dir
+        :param render_profiles: render_profiles.PROFILES names to deliver, defaults to constants.RENDER_PROFILES;
+            the first one is written to final_video.mp4
+        :param extractor: StructuredOutputExtractor for TopN (e.g. one wrapping fakes.FakeChatModel), defaults to the shared one
+        :param media_dir: directory the run directories are created in
+        """
         self.video_title = None
         self.result = None
-        self.media_dir = 'generated_media'
+        self.media_dir = media_dir
         self.generated_video_dir = None
         self.image_dir = None
         self.audio_clips_dir = None
+        self.overlay_dir = None
         self.video_path = None
+        # finished video per render profile
+        self.video_paths = {}
+        self.run_id = validate_run_id(run_id) if run_id is not None else None
+        self.manifest = None
+        self.image_errors = {}
+        # images replaced by a placeholder because the Space kept failing: name -> error
+        self.image_placeholders = {}
+        self.audio_errors = {}
+        self.tts = tts or TextToSpeech()
+        self.image_generator = image_generator or ImageGenerator()
+        self.stage_timings = {}
+        self.persist_frames = persist_frames
+        self.render_profiles = list(render_profiles or constants.RENDER_PROFILES)
+        # images are generated once, large enough for every profile
+        self.image_size = source_image_size(self.render_profiles)
+        # overlaid frames (PIL images) per render profile and name ("title", "0", "1", ...), handed straight to make_video
+        self.frames = {}
+        self.tracer = tracer or Tracer()
+        self.extractor = extractor
 
         os.makedirs(self.media_dir,exist_ok=True)
+        self.retention = retention or get_retention_manager(self.media_dir)
 
+    @stage('keywords')
     def title_to_keywords(self, title):
-        # Define your data extraction model here
-        class TopN(BaseModel):
-            title: str = Field(description="the title of the youtube video")
-            title_image_prompt: str = Field(description="highly detailed and descriptive image prompt for the background image of Title")
-            items: list[str] = Field(description="top n number of requested items")
-            items_image_prompts: list[str] = Field(description="highly detailed and descriptive image prompts for each item ")
-
-        # Assuming StructuredOutputExtractor is defined and functional
-        extractor = StructuredOutputExtractor(response_schema=TopN)
-        result = extractor.extract(title)
-        self.result = result
+        # a resumed run already has its directory and, usually, its extracted result
+        run_dir = find_run_dir(self.media_dir, self.run_id) if self.run_id else None
+        if run_dir:
+            self.generated_video_dir = run_dir
+            self.retention.acquire(run_dir)
+            self.manifest = RunManifest(run_dir, self.run_id, title=title)
+            if self.manifest.result:
+                count('checkpoint.result_reused')
+                print(f"Resuming run {self.run_id} from {run_dir}")
+                self.result = TopN(**self.manifest.result)
+                return self
+
+        # repeat titles are answered from the result cache without calling the LLM
+        cache_key = _title_cache_key(title)
+        result = _title_results.get(cache_key)
+        if result is None:
+            # the extractor (chat model + compiled graph) is built once per process
+            extractor = self.extractor or get_extractor(TopN)
+            result = extractor.extract(title)
+            if result is not None:
+                _title_results.set(cache_key, result)
+        else:
+            count('llm.cache_hit')
+            print(f"Title cache hit for: {title}")
+        if result is None:
+            # the extractor reports failures as None once its retries and fallback are used up
+            raise RuntimeError(f"Could not extract the video outline for '{title}' from the LLM")
+        # hand out a copy so callers can't modify the cached result
+        self.result = result.model_copy(deep=True)
 
         # create main directory for saving  video related content  i.e images, audio_clips
-        video_title = self.result.title
-        unique_id = uuid.uuid4().hex
-        folder_path = f"{self.media_dir}/generated_{video_title}_{unique_id}"
-        self.generated_video_dir = folder_path
+        if not run_dir:
+            video_title = self.result.title
+            self.run_id = self.run_id or uuid.uuid4().hex
+            folder_path = f"{self.media_dir}/generated_{video_title}_{self.run_id}"
+            # the title comes from the LLM, so it must not be able to move the run out of media_dir
+            media_root = os.path.realpath(self.media_dir)
+            if os.path.commonpath([media_root, os.path.realpath(folder_path)]) != media_root:
+                raise ValueError(f"Run directory for '{video_title}' would be outside {self.media_dir}")
+            self.generated_video_dir = folder_path
+            self.retention.acquire(folder_path)
+            self.manifest = RunManifest(folder_path, self.run_id, title=title)
+
+        # checkpoint the result so a rerun with this run_id skips the LLM
+        self.manifest.record_result(self.result.model_dump())
 
         return self
     
-    def generate_images(self):
+    @stage('images')
+    def generate_images(self, max_workers=None):
         if not self.result:
             print("No data available. Call title_to_keywords first.")
             return self
         
         print(self.result,'inside generate_images()')
         
-        generator = ImageGenerator()  # Your custom image generator
-        folder_path = f"{self.generated_video_dir}/generated_images"  # Append unique ID
-        os.makedirs(folder_path, exist_ok=True)  # Ensure directory is created
-        self.image_dir = folder_path
+        generator = self.image_generator
+        folder_path = self._make_image_dir()
 
-        # Generate Title Image
-        # generator.generate_image(self.result.title_image_prompt, path=f"{folder_path}/title.png")
         print("Title Prompt: ",self.result.title_image_prompt)
-
-        # generate images using stable-diffusion-turbo
-        generator.generate_image(self.result.title_image_prompt, path=f"{folder_path}/title.png")
-
-
         print("Generating Images...")
-        image_prompts = self.result.items_image_prompts
-        print("items image prompts: ", image_prompts)
-        image_prompts = reversed(image_prompts)
-        print("Image Prompts: ", image_prompts)  # Placeholder for actual image processing
-
-        # Generate and save images
-        for index, image_prompt in enumerate(image_prompts):
-            
-            # generate images using stable-diffusion-turbo
-            generator.generate_image(image_prompt, f"{folder_path}/{index}.png" )  
-            print(f"Image {index} saved.")
+        print("items image prompts: ", self.result.items_image_prompts)
+
+        # each generate_image call is a remote round-trip, so keep several in flight
+        max_workers = max_workers or constants.IMAGE_GENERATION_MAX_WORKERS
+        self.image_errors = {}
+        self.image_placeholders = {}
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(bind(generator.generate_image), image_prompt, f"{folder_path}/{name}.png",
+                                width=self.image_size[0], height=self.image_size[1]): name
+                for name, image_prompt, _, _ in self._image_jobs()
+                if not self._is_checkpointed(f"{folder_path}/{name}.png")
+            }
+            for future in as_completed(futures):
+                name = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = {"error": str(e)}
+                if isinstance(result, dict) and "placeholder" in result:
+                    # usable for this video, but not a finished asset of the run
+                    self.image_placeholders[name] = result["error"]
+                    print(f"Image {name} replaced by a placeholder: {result['error']}")
+                elif isinstance(result, dict) and "error" in result:
+                    self.image_errors[name] = result["error"]
+                    print(f"Image {name} failed: {result['error']}")
+                else:
+                    self._checkpoint(f"{folder_path}/{name}.png")
+                    print(f"Image {name} saved.")
+
+        if self.image_errors:
+            failed = ", ".join(f"{name}.png ({error})" for name, error in sorted(self.image_errors.items()))
+            raise RuntimeError(f"Image generation failed for {len(self.image_errors)} image(s): {failed}")
 
         return self  # Return self for further chaining if needed
     
 
+    @stage('overlay')
     def overlay_text_to_images(self):
         if not self.result:
             print("No data available. Call title_to_keywords first.")
             return self
         
-        title_text = self.result.title
-        text_items = reversed(self.result.items)
-        print("text_items ",text_items)
-
-        # add text to title image
-        add_text_to_image(text=title_text,image_path=f"{self.image_dir}/title.png", save_to=f"{self.image_dir}/title.png")
-        
-        # add text to other images
-        for index, text in enumerate(text_items):
-            image_path = f"{self.image_dir}/{index}.png"
-            add_text_to_image(text=text,image_path=image_path,is_title=False, save_to=image_path)
+        # add text to the title image and the item images, all frames of all profiles in one batch
+        self._overlay_frames(self._image_jobs())
 
         return self
         
         
 
     
-    def generate_audio_clips(self):
+    @stage('audio')
+    def generate_audio_clips(self, max_workers=None):
         if not self.result:
             print("No data available. Call title_to_keywords first.")
             return self
         
-        print("Generating Title Audio...")
-        overlay_title = self.result.title
-        print("Title: ", overlay_title)
-
-        
+        print("Title: ", self.result.title)
         print("Generating Audio Clips...")
-        overlay_text_items = reversed(self.result.items)
-        print("Overlay Text: ", overlay_text_items)  # Placeholder for actual text processing
+        self._make_audio_dir()
+
+        # each clip is a separate blocking TTS request, so synthesize them concurrently
+        tts = self.tts if max_workers is None else TextToSpeech(self.tts.backend, self.tts.cache, max_workers)
+        jobs = [(text, clip_path) for text, clip_path in self._audio_jobs() if not self._is_checkpointed(clip_path)]
+        self.audio_errors = tts.synthesize_many(jobs)
+        for _, clip_path in jobs:
+            if clip_path not in self.audio_errors:
+                self._checkpoint(clip_path)
+        if self.audio_errors:
+            failed = ", ".join(f"{os.path.basename(path)} ({error})" for path, error in sorted(self.audio_errors.items()))
+            raise RuntimeError(f"Audio generation failed for {len(self.audio_errors)} clip(s): {failed}")
+
+        return self  # Return self for further chaining if needed
+
+    def _image_jobs(self):
+        """(file name, image prompt, overlay text, is_title) for the title and each item, in countdown order."""
+        jobs = [("title", self.result.title_image_prompt, self.result.title, True)]
+        items = zip(reversed(self.result.items_image_prompts), reversed(self.result.items))
+        for index, (image_prompt, text) in enumerate(items):
+            jobs.append((str(index), image_prompt, text, False))
+        return jobs
+
+    def _audio_jobs(self):
+        """(spoken text, clip path) for the title and each item, in countdown order."""
+        return [(text, f"{self.audio_clips_dir}/{name}.mp3") for name, _, text, _ in self._image_jobs()]
+
+    def _overlay_frame(self, name, text, is_title):
+        """Overlay one generated image as soon as it exists (streaming mode), see _overlay_frames."""
+        with span('overlay', item=name, profiles=len(self.render_profiles)):
+            self._overlay_frames([(name, None, text, is_title)])
+        return {profile: self.frames[profile][name] for profile in self.render_profiles}
+
+    def _overlay_frames(self, image_jobs):
+        """
+        Derive every render profile's frame from the generated images and overlay the text laid out for each size.
 
-        folder_path = f"{self.generated_video_dir}/generated_audio_clips"  # Append unique ID
-        self.audio_clips_dir = folder_path
+        Each source image is decoded once for all its variants; frames are kept in memory as
+        RGB arrays (and written to disk if persist_frames).
 
-        os.makedirs(folder_path, exist_ok=True)  # Ensure directory is created
+        :param image_jobs: (name, image prompt, overlay text, is_title) tuples as returned by _image_jobs
+        """
+        if self.persist_frames:
+            # overlaid frames go to their own directory so the generated image stays a valid checkpoint
+            self.overlay_dir = f"{self.generated_video_dir}/overlaid_images"
+
+        jobs, keys = [], []
+        for name, _, text, is_title in image_jobs:
+            with Image.open(f"{self.image_dir}/{name}.png") as image:
+                source = image.convert('RGB')
+            for profile in self.render_profiles:
+                jobs.append((source, text, is_title, get_render_profile(profile)['size']))
+                keys.append((profile, name))
+
+        for (profile, name), frame in zip(keys, overlay_frames(jobs, executor=get_overlay_executor())):
+            self.frames.setdefault(profile, {})[name] = frame
+            if self.persist_frames:
+                os.makedirs(f"{self.overlay_dir}/{profile}", exist_ok=True)
+                Image.fromarray(frame).save(f"{self.overlay_dir}/{profile}/{name}.png")
+
+    def _is_checkpointed(self, path):
+        """True if a resumed run already produced this asset and it is still intact."""
+        if self.manifest is not None and self.manifest.is_complete(path):
+            count('checkpoint.asset_reused')
+            print(f"Reusing checkpointed {path}")
+            return True
+        return False
+
+    def _checkpoint(self, path):
+        if self.manifest is not None:
+            self.manifest.record_asset(path)
+
+    def _make_image_dir(self):
+        self.image_dir = f"{self.generated_video_dir}/generated_images"
+        os.makedirs(self.image_dir, exist_ok=True)
+        return self.image_dir
+
+    def _make_audio_dir(self):
+        self.audio_clips_dir = f"{self.generated_video_dir}/generated_audio_clips"
+        os.makedirs(self.audio_clips_dir, exist_ok=True)
+        return self.audio_clips_dir
+
+    def generate_streaming(self, title, image_workers=None, audio_workers=None, encode_executor=None):
+        """
+        Run the whole pipeline, scheduling each per-item task as soon as its inputs exist.
 
-        # Generate title Audio
-        title_tts = gTTS(text=overlay_title)
-        title_tts.save(f"{folder_path}/title.mp3")
-        print(f"Title Audio clip title.mp3 saved.")
+        TTS only depends on the extracted items, so it runs alongside image generation,
+        and each image is overlaid as soon as it arrives. Wall time therefore tends
+        towards the slowest branch instead of the sum of all stages. Per-stage wall
+        times are stored in ``self.stage_timings``.
 
-        # Generate and save audio clips
-        for index, text_overlay in enumerate(overlay_text_items):
-            tts = gTTS(text=text_overlay)  # Generate audio clip
-            tts.save(f"{folder_path}/{index}.mp3")  # Save the audio as MP3
-            print(f"Audio clip {index} saved.")
+        :param title: video title, e.g. "Top 5 Marvel Superheroes"
+        :param image_workers: image requests kept in flight, defaults to constants.IMAGE_GENERATION_MAX_WORKERS
+        :param audio_workers: clips synthesized at once, defaults to the TextToSpeech worker count
+        :param encode_executor: optional process pool the final video encoding is submitted to
+        """
+        started = time.perf_counter()
+        self.stage_timings = {}
 
-        return self  # Return self for further chaining if needed
-        
+        with self.tracer.activate(), self.tracer.span('run', kind='run', title=title):
+            self.title_to_keywords(title)
+            self.stage_timings['keywords'] = time.perf_counter() - started
+            if not self.result:
+                raise RuntimeError(f"Could not extract keywords from title: {title}")
 
-    def make_video(self):
-        # Ensure title is included and sorted properly
-        audio_files = sorted(os.listdir(self.audio_clips_dir), key=lambda x: (x != "title.mp3", int(x.split(".")[0]) if x != "title.mp3" else -1))
-        image_files = sorted(os.listdir(self.image_dir), key=lambda x: (x != "title.png", int(x.split(".")[0]) if x != "title.png" else -1))
+            if self._videos_checkpointed():
+                self.retention.record(self.generated_video_dir)
+                self.stage_timings['total'] = time.perf_counter() - started
+                return self
 
-        print("Sorted audio files:", audio_files)
-        print("Sorted image files:", image_files)
+            self._generate_assets(image_workers, audio_workers)
 
-        # Initialize audio clips
-        audio_clips = [AudioFileClip(os.path.join(self.audio_clips_dir, audio)) for audio in audio_files]
+            video_started = time.perf_counter()
+            self.make_video(executor=encode_executor)
+            self.stage_timings['video'] = time.perf_counter() - video_started
+            self.stage_timings['total'] = time.perf_counter() - started
 
-        # Initialize image clips with matching durations
-        image_clips = [ImageClip(os.path.join(self.image_dir, image)).set_duration(audio.duration) 
-                    for image, audio in zip(image_files, audio_clips)]
+        print("Stage timings (s):", {stage: round(seconds, 2) for stage, seconds in self.stage_timings.items()})
+        return self
 
-        # Attach audio to images
-        image_clips_with_audio = [image.set_audio(audio) for image, audio in zip(image_clips, audio_clips)]
+    @stage('assets')
+    def _generate_assets(self, image_workers=None, audio_workers=None):
+        """Generate + overlay every image and synthesize every clip concurrently (the middle of generate_streaming)."""
+        self._make_image_dir()
+        self._make_audio_dir()
+        self.image_errors = {}
+        self.image_placeholders = {}
+        self.audio_errors = {}
+
+        def image_then_overlay(name, image_prompt, text, is_title):
+            image_path = f"{self.image_dir}/{name}.png"
+            if not self._is_checkpointed(image_path):
+                result = self.image_generator.generate_image(image_prompt, image_path, width=self.image_size[0], height=self.image_size[1])
+                if isinstance(result, dict) and "placeholder" in result:
+                    self.image_placeholders[name] = result["error"]
+                    print(f"Image {name} replaced by a placeholder: {result['error']}")
+                elif isinstance(result, dict) and "error" in result:
+                    raise RuntimeError(result["error"])
+                else:
+                    self._checkpoint(image_path)
+            overlay_started = time.perf_counter()
+            self._overlay_frame(name, text, is_title)
+            return time.perf_counter() - overlay_started
+
+        def synthesize_then_checkpoint(text, clip_path):
+            self.tts.synthesize(text, clip_path)
+            self._checkpoint(clip_path)
+
+        branches_started = time.perf_counter()
+        branch_finished = {'images': branches_started, 'audio': branches_started}
+        overlay_seconds = 0.0
+        with ThreadPoolExecutor(max_workers=image_workers or constants.IMAGE_GENERATION_MAX_WORKERS) as image_executor, \
+                ThreadPoolExecutor(max_workers=audio_workers or self.tts.max_workers) as audio_executor:
+            futures = {}
+            for name, image_prompt, text, is_title in self._image_jobs():
+                futures[image_executor.submit(bind(image_then_overlay), name, image_prompt, text, is_title)] = ('images', name)
+            for text, clip_path in self._audio_jobs():
+                if not self._is_checkpointed(clip_path):
+                    futures[audio_executor.submit(bind(synthesize_then_checkpoint), text, clip_path)] = ('audio', clip_path)
+
+            for future in as_completed(futures):
+                branch, name = futures[future]
+                try:
+                    value = future.result()
+                except Exception as e:
+                    errors = self.image_errors if branch == 'images' else self.audio_errors
+                    errors[name] = str(e)
+                    print(f"{branch} task {name} failed: {e}")
+                else:
+                    if branch == 'images':
+                        overlay_seconds += value
+                    print(f"{branch} task {name} done.")
+                branch_finished[branch] = time.perf_counter()
+
+        self.stage_timings['images'] = branch_finished['images'] - branches_started
+        self.stage_timings['overlay'] = overlay_seconds
+        self.stage_timings['audio'] = branch_finished['audio'] - branches_started
+
+        if self.image_errors or self.audio_errors:
+            failed = [f"{name}.png ({error})" for name, error in sorted(self.image_errors.items())]
+            failed += [f"{os.path.basename(path)} ({error})" for path, error in sorted(self.audio_errors.items())]
+            raise RuntimeError(f"Generation failed for {len(failed)} asset(s): {', '.join(failed)}")
+
+    def _final_video_path(self, profile=None):
+        """final_video.mp4 for the first render profile, final_video_<profile>.mp4 for the others."""
+        if profile is None or profile == self.render_profiles[0]:
+            return os.path.join(self.generated_video_dir, 'final_video.mp4')
+        return os.path.join(self.generated_video_dir, f'final_video_{profile}.mp4')
+
+    def _videos_checkpointed(self):
+        """True if a resumed run already encoded every render profile; fills in video_path(s) if so."""
+        paths = {profile: self._final_video_path(profile) for profile in self.render_profiles}
+        if not all(self._is_checkpointed(path) for path in paths.values()):
+            return False
+        self.video_paths = paths
+        self.video_path = self._final_video_path()
+        return True
+
+    def _profile_images(self, profile):
+        """Frames of one render profile in playback order: in memory, persisted overlays, or the raw images."""
+        if self.frames.get(profile):
+            # overlaid frames are still in memory, so skip the PNG round-trip
+            frames = self.frames[profile]
+            frame_names = sorted(frames, key=lambda x: (x != "title", int(x) if x != "title" else -1))
+            print(f"In-memory {profile} frames:", frame_names)
+            return [frames[name] for name in frame_names]
+
+        profile_overlay_dir = f"{self.overlay_dir}/{profile}" if self.overlay_dir else None
+        frames_dir = profile_overlay_dir if profile_overlay_dir and os.path.isdir(profile_overlay_dir) else self.image_dir
+        image_files = sorted(os.listdir(frames_dir), key=lambda x: (x != "title.png", int(x.split(".")[0]) if x != "title.png" else -1))
+        print(f"Sorted {profile} image files:", image_files)
+        return [os.path.join(frames_dir, image) for image in image_files]
+
+    @stage('video')
+    def make_video(self, engine=None, executor=None, profile=None):
+        """
+        Encode one video per render profile, all variants in parallel.
 
-        # Concatenate all video clips
-        video_clip = concatenate_videoclips(image_clips_with_audio, method="compose")
+        :param engine: video engine name, defaults to constants.VIDEO_ENGINE
+        :param profile: encoding profile name for every variant, defaults to each render profile's own
+        :param executor: optional (process pool) executor the encodings are submitted to
+        """
+        if self._videos_checkpointed():
+            self.retention.record(self.generated_video_dir)
+            return self
 
-        # Save the final video
-        video_clip.write_videofile(
-            os.path.join(self.generated_video_dir, 'final_video.mp4'), 
-            codec='libx264', 
-            fps=24
-        )
+        # Ensure title is included and sorted properly
+        audio_files = sorted(os.listdir(self.audio_clips_dir), key=lambda x: (x != "title.mp3", int(x.split(".")[0]) if x != "title.mp3" else -1))
+        print("Sorted audio files:", audio_files)
+        audio_paths = [os.path.join(self.audio_clips_dir, audio) for audio in audio_files]
+
+        # decode the clips once into one narration track shared by every variant
+        with span('audio_assembly', clips=len(audio_paths)):
+            track = assemble_audio(audio_paths, f"{self.generated_video_dir}/narration.wav")
+
+        engine = engine or constants.VIDEO_ENGINE
+        pending = [render_profile for render_profile in self.render_profiles
+                   if not self._is_checkpointed(self._final_video_path(render_profile))]
+        # variants share the cores, so each gets a slice of the segment encoders
+        workers = max(1, constants.VIDEO_ENCODE_WORKERS // max(len(pending), 1))
+
+        def encode(render_profile):
+            # Pair each image with the exact length of its narration and assemble the slideshow
+            segments = list(zip(self._profile_images(render_profile), track.durations))
+            video_path = self._final_video_path(render_profile)
+            encoding = profile or get_render_profile(render_profile)['encoding']
+            with span('encode', engine=engine, profile=encoding, render_profile=render_profile, segments=len(segments)):
+                if executor is not None:
+                    executor.submit(make_slideshow, segments, video_path, engine=engine, profile=encoding,
+                                    workers=workers, audio_track=track.path).result()
+                else:
+                    make_slideshow(segments, video_path, engine=engine, profile=encoding, workers=workers, audio_track=track.path)
+            count_file_bytes('bytes.video', video_path)
+            # a video with placeholder images is delivered but not checkpointed, so resuming the run regenerates it
+            if not self.image_placeholders:
+                self._checkpoint(video_path)
+            return video_path
+
+        with ThreadPoolExecutor(max_workers=max(len(pending), 1)) as variant_executor:
+            for future in [variant_executor.submit(bind(encode), render_profile) for render_profile in pending]:
+                print(f"Encoded {future.result()}")
+        self.video_paths = {render_profile: self._final_video_path(render_profile) for render_profile in self.render_profiles}
+        self.video_path = self._final_video_path()
 
         self.remove_directory(self.image_dir)
         self.remove_directory(self.audio_clips_dir)
+        os.remove(track.path)
+        if self.overlay_dir:
+            self.remove_directory(self.overlay_dir)
 
+        # index the finished run and let the background sweeper evict old ones
+        self.retention.record(self.generated_video_dir)
+        self.retention.request_cleanup()
 
-        existing_videos = sorted(
-            [os.path.join(self.media_dir, d) for d in os.listdir(self.media_dir) 
-             if os.path.isdir(os.path.join(self.media_dir, d))],
-            key=os.path.getctime  # Sort by creation time (oldest first)
-        )
-
-        if len(existing_videos) > 5:
-            for old_video_dir in existing_videos[:-5]:  # Keep last 5, delete the rest
-                if old_video_dir != self.generated_video_dir:  # Ensure we don't delete the current video
-                    self.remove_directory(old_video_dir)
+        self.tracer.write_counters()
 
     @staticmethod
     def remove_directory(dir_path):